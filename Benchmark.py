@@ -0,0 +1,450 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from CompactDictionary import CompactDictionary
+from SpellEngine import BACKENDS, SpellEngine
+
+# Corpora are made of the VOCABULARY_SIZE most frequent dictionary words,
+# drawn by frequency, plus MISSPELLING_FORMS misspelled variants of them
+VOCABULARY_SIZE = 20000
+MISSPELLING_FORMS = 2000
+
+# Line length profiles: (mean, standard deviation) in characters, None for
+# text that is one single line
+LINE_PROFILES = {
+    "short": (40, 15),
+    "prose": (80, 20),
+    "paragraph": (1000, 400),
+    "single": None,
+}
+
+# Sentences run between these many words, words are drawn a batch at a time
+SENTENCE_WORDS = (5, 25)
+GENERATE_BATCH = 100000
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "spell_benchmark")
+
+# Bumped whenever the generator changes, so old corpora are not reused
+CORPUS_VERSION = 1
+RESULTS_VERSION = 1
+
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(text):
+    """Bytes in a size such as 512K, 16M or 2G"""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    """Short size label, e.g. 16M"""
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+def misspell(word, rng):
+    """word with one random deletion, transposition, replacement or insertion"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    position = rng.randrange(len(word))
+    edit = rng.randrange(4)
+    if edit == 0:
+        return word[:position] + word[position + 1 :]
+    if edit == 1 and position < len(word) - 1:
+        return (
+            word[:position] + word[position + 1] + word[position] + word[position + 2 :]
+        )
+    if edit == 2:
+        return word[:position] + rng.choice(letters) + word[position + 1 :]
+    return word[:position] + rng.choice(letters) + word[position:]
+
+
+def corpus_vocabulary(dictionary, seed):
+    """(words, cumulative weights, misspelled forms) to draw a corpus from"""
+    rng = random.Random(seed)
+    ranked = sorted(
+        (
+            (dictionary.frequencies[word_id], dictionary.word(word_id))
+            for word_id in range(len(dictionary))
+        ),
+        reverse=True,
+    )
+    words = [word for _, word in ranked if word.isalpha()][:VOCABULARY_SIZE]
+    weights = list(itertools.accumulate(dictionary[word] for word in words))
+
+    misspellings = set()
+    candidates = [word for word in words if len(word) >= 4]
+    while len(misspellings) < MISSPELLING_FORMS:
+        variant = misspell(rng.choice(candidates), rng)
+        if dictionary.unknown([variant]):
+            misspellings.add(variant)
+    return words, weights, sorted(misspellings)
+
+
+def generate_corpus(path, size, misspelling_rate, lines, seed, dictionary):
+    """Write a reproducible synthetic corpus of about size bytes to path
+
+    Words are drawn by dictionary frequency and replaced by a misspelled
+    form at misspelling_rate, sentences are capitalized and end in a full
+    stop, and lines are broken at lengths drawn from a LINE_PROFILES entry.
+    Only misspellings, sentences and lines are placed one at a time, the
+    words themselves are drawn and joined a batch at a time, so even
+    corpora of several GB take minutes. Returns what went into it, so a run
+    can be checked against it.
+    """
+    words, weights, misspellings = corpus_vocabulary(dictionary, seed)
+    rng = random.Random(seed)
+    profile = LINE_PROFILES[lines]
+
+    def error_gap():
+        # Geometric gaps between misspelled words give each word the same odds
+        if misspelling_rate >= 1:
+            return 1
+        if misspelling_rate <= 0:
+            return GENERATE_BATCH + 1
+        return 1 + int(math.log(1 - rng.random()) / math.log(1 - misspelling_rate))
+
+    written = 0
+    word_count = 0
+    misspelled_count = 0
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        while written < size:
+            batch = rng.choices(words, cum_weights=weights, k=GENERATE_BATCH)
+            errors = []
+            position = error_gap() - 1
+            while position < len(batch):
+                batch[position] = rng.choice(misspellings)
+                errors.append(position)
+                position += error_gap()
+
+            position = 0
+            while position < len(batch):
+                batch[position] = batch[position].capitalize()
+                position += rng.randint(*SENTENCE_WORDS)
+                batch[min(position, len(batch)) - 1] += "."
+            text = " ".join(batch)
+
+            if profile is not None:
+                mean, deviation = profile
+                pieces = []
+                start = 0
+                while True:
+                    end = start + max(1, int(rng.gauss(mean, deviation)))
+                    if end >= len(text):
+                        break
+                    cut = text.rfind(" ", start, end + 1)
+                    if cut <= start:
+                        cut = text.find(" ", end)
+                        if cut < 0:
+                            break
+                    pieces.append(text[start:cut])
+                    start = cut + 1
+                pieces.append(text[start:])
+                text = "\n".join(pieces)
+            text += "\n" if profile is not None else " "
+
+            if written + len(text) > size:
+                # Stop at the last word that still fits
+                text = text[: size - written]
+                text = text[: max(text.rfind(" "), text.rfind("\n")) + 1]
+                kept = len(text.split())
+                batch = batch[:kept]
+                errors = [position for position in errors if position < kept]
+                if not text:
+                    break
+            file.write(text)
+            written += len(text.encode("utf-8"))
+            word_count += len(batch)
+            misspelled_count += len(errors)
+    os.replace(temp_path, path)
+
+    return {
+        "bytes": os.path.getsize(path),
+        "words": word_count,
+        "misspelled_occurrences": misspelled_count,
+        "misspelling_rate": misspelling_rate,
+        "lines": lines,
+        "seed": seed,
+    }
+
+
+def corpus(size, misspelling_rate, lines, seed, corpus_dir, dictionary):
+    """Path and description of a corpus, generating it if it does not exist yet"""
+    name = (
+        f"corpus-v{CORPUS_VERSION}-{format_size(size)}-{misspelling_rate:g}"
+        f"-{lines}-{seed}"
+    )
+    path = os.path.join(corpus_dir, f"{name}.txt")
+    info_path = os.path.join(corpus_dir, f"{name}.json")
+    if os.path.exists(path) and os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as file:
+            return path, json.load(file)
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    print(f"Generating {path}...", file=sys.stderr)
+    start_time = time.perf_counter()
+    info = generate_corpus(path, size, misspelling_rate, lines, seed, dictionary)
+    info["generate_time"] = time.perf_counter() - start_time
+    with open(info_path, "w", encoding="utf-8") as file:
+        json.dump(info, file, indent=2)
+    return path, info
+
+
+def peak_rss():
+    """Peak resident set size in bytes of this process and of its children
+
+    Linux carries ru_maxrss of a process across exec, so a run started from
+    a large harness would report the harness's peak. Its own peak is read
+    from VmHWM in /proc instead, which starts over at exec. The children
+    are worker processes forked from the run, so their ru_maxrss is theirs.
+    """
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    try:
+        with open("/proc/self/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    own = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass  # No /proc, e.g. on macOS
+    return own, children
+
+
+def run_one(config):
+    """Check a corpus with one configuration and return the measurements
+
+    Runs in a fresh process per configuration, so the peak RSS and the word
+    memo only ever belong to that configuration.
+    """
+    engine = SpellEngine(
+        num_workers=config["threads"],
+        backend=config["backend"],
+        chunk_size=config["chunk_size"],
+        prefilter=config.get("prefilter", False),
+    )
+    engine.spell  # Load the dictionary before the clock starts
+    try:
+        start_time = time.perf_counter()
+        result = engine.check(config["path"])
+        elapsed = time.perf_counter() - start_time
+    finally:
+        engine.close()
+    own_rss, children_rss = peak_rss()
+
+    return {
+        "seconds": elapsed,
+        "words": result["total_words"],
+        "words_per_sec": result["total_words"] / elapsed if elapsed else 0.0,
+        "mb_per_sec": result["bytes"] / elapsed / 1024**2 if elapsed else 0.0,
+        "bytes": result["bytes"],
+        "chunks": len(result["chunks"]),
+        "dictionary_lookups": result["dictionary_lookups"],
+        "misspelled_words": len(result["misspelled"]),
+        "misspelled_occurrences": sum(result["counts"].values()),
+        "timings": result["timings"],
+        "peak_rss": own_rss,
+        "peak_rss_workers": children_rss,
+    }
+
+
+def run_isolated(config):
+    """run_one in a child process, so every run starts from a clean slate"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-one", json.dumps(config)],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip() or "benchmark run failed")
+    return json.loads(completed.stdout)
+
+
+def summarize(measurements):
+    """Median of each number over repeated runs, with the best words/sec"""
+    summary = {}
+    for key, value in measurements[0].items():
+        if isinstance(value, dict):
+            summary[key] = summarize([m[key] for m in measurements])
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            summary[key] = statistics.median_low(m[key] for m in measurements)
+        else:
+            summary[key] = value
+    if "words_per_sec" in summary:
+        summary["best_words_per_sec"] = max(m["words_per_sec"] for m in measurements)
+    return summary
+
+
+def config_key(run):
+    """What identifies a configuration across result files"""
+    return tuple(
+        run[name]
+        for name in ("size", "misspelling_rate", "lines", "backend", "threads")
+    ) + (run["chunk_size"] or 0, run.get("prefilter", False))
+
+
+def compare(previous_path, runs):
+    """Print words/sec against the matching runs of an earlier result file"""
+    with open(previous_path, encoding="utf-8") as file:
+        previous = {config_key(run): run for run in json.load(file)["runs"]}
+    for run in runs:
+        old = previous.get(config_key(run))
+        if old is None:
+            continue
+        ratio = run["words_per_sec"] / old["words_per_sec"]
+        print(
+            f"{describe(run)}: {old['words_per_sec']:,.0f} -> "
+            f"{run['words_per_sec']:,.0f} words/s ({ratio:.2f}x)",
+            file=sys.stderr,
+        )
+
+
+def describe(run):
+    """One-line label of a run's configuration"""
+    chunk = format_size(run["chunk_size"]) if run["chunk_size"] else "adaptive"
+    return (
+        f"{format_size(run['size'])} {run['lines']} "
+        f"{run['misspelling_rate']:.1%} errors, {run['backend']} x{run['threads']}, "
+        f"{chunk} chunks"
+    )
+
+
+def environment():
+    """Machine and version details stored with the results"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=False,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit or None,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the checking pipeline on synthetic corpora"
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", default=["1M", "16M"], help="corpus sizes, e.g. 1M 2G"
+    )
+    parser.add_argument(
+        "--misspelling-rates",
+        nargs="+",
+        type=float,
+        default=[0.02],
+        help="fraction of words misspelled",
+    )
+    parser.add_argument(
+        "--lines",
+        nargs="+",
+        choices=sorted(LINE_PROFILES),
+        default=["prose"],
+        help="line length profiles",
+    )
+    parser.add_argument(
+        "--threads", nargs="+", type=int, default=[1, 2, 4], help="worker counts"
+    )
+    parser.add_argument(
+        "--chunk-sizes",
+        nargs="+",
+        default=["adaptive"],
+        help="chunk sizes in bytes (e.g. 64K 1M), 'adaptive' for the scheduler",
+    )
+    parser.add_argument(
+        "--backends", nargs="+", choices=BACKENDS, default=["thread"], help="backends"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="corpus random seed")
+    parser.add_argument(
+        "--prefilter", action="store_true", help="use the dictionary's Bloom filter"
+    )
+    parser.add_argument(
+        "--corpus-dir", default=DEFAULT_CORPUS_DIR, help="where corpora are kept"
+    )
+    parser.add_argument("--output", help="write the results JSON here, not stdout")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        print(json.dumps(run_one(json.loads(args.run_one))))
+        return 0
+
+    dictionary = CompactDictionary.load_or_build()
+    chunk_sizes = [
+        None if size == "adaptive" else parse_size(size) for size in args.chunk_sizes
+    ]
+    runs = []
+    for size, rate, lines in itertools.product(
+        map(parse_size, args.sizes), args.misspelling_rates, args.lines
+    ):
+        path, info = corpus(size, rate, lines, args.seed, args.corpus_dir, dictionary)
+        for backend, threads, chunk_size in itertools.product(
+            args.backends, args.threads, chunk_sizes
+        ):
+            run = {
+                "size": size,
+                "misspelling_rate": rate,
+                "lines": lines,
+                "backend": backend,
+                "threads": threads,
+                "chunk_size": chunk_size,
+                "prefilter": args.prefilter,
+                "corpus": info,
+            }
+            config = dict(run, path=path)
+            run.update(summarize([run_isolated(config) for _ in range(args.repeat)]))
+            runs.append(run)
+            print(
+                f"{describe(run)}: {run['words_per_sec']:,.0f} words/s, "
+                f"{run['mb_per_sec']:.1f} MB/s, peak RSS "
+                f"{(run['peak_rss'] or 0) / 1024**2:.0f} MB",
+                file=sys.stderr,
+            )
+
+    results = {"version": RESULTS_VERSION, "environment": environment(), "runs": runs}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        compare(args.compare, runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
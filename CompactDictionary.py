@@ -0,0 +1,494 @@
+import argparse
+import hashlib
+import importlib.util
+import mmap
+import os
+import string
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+# File layout: header, frequencies, word offsets, hash slots, Bloom filter,
+# words. The header is 48 bytes so the 8-byte frequency table starts aligned.
+MAGIC = b"SPDC"
+VERSION = 2
+HEADER = struct.Struct("<4sIIIIIIIQQ")
+
+# The Bloom filter prefilter sets BLOOM_HASHES of BLOOM_BITS_PER_WORD bits per
+# word, which lets through about 2% of the words that are not stored. A word
+# it rejects is certainly not in the dictionary, so the hash table is only
+# probed for possible hits. It is saved with every dictionary but only
+# consulted when asked for: it makes misspelled words cheaper to rule out and
+# correct ones a little dearer, so it pays off on text with many errors.
+BLOOM_BITS_PER_WORD = 10
+BLOOM_HASHES = 2
+
+DEFAULT_DICTIONARY_DIR = os.path.join(
+    os.path.expanduser("~"), ".parallel_spell_checker"
+)
+
+# Words the checker never reports, the same ones SpellChecker skips
+NEVER_CHECKED = set(string.punctuation)
+NOT_NUMBERS = ("nan", "inf", "infinity")
+
+
+def default_path(language):
+    """Where the compact dictionary of a language is kept"""
+    return os.path.join(DEFAULT_DICTIONARY_DIR, f"{language}.dict")
+
+
+def source_fingerprint(language):
+    """Identifies the pyspellchecker word list a dictionary is built from
+
+    Taken from the size and modification time of the packaged resource, so
+    checking whether a saved dictionary is current needs neither the
+    spellchecker import nor decompressing its JSON.
+    """
+    spec = importlib.util.find_spec("spellchecker")
+    digest = hashlib.blake2b(language.encode(), digest_size=8)
+    if spec is not None and spec.submodule_search_locations:
+        package_dir = spec.submodule_search_locations[0]
+        resource = os.path.join(package_dir, "resources", f"{language}.json.gz")
+        try:
+            stat = os.stat(resource)
+            digest.update(f":{stat.st_size}:{stat.st_mtime_ns}".encode())
+        except OSError:
+            pass
+    return int.from_bytes(digest.digest(), "little")
+
+
+def word_hash(data):
+    """Stable 32-bit hash of an encoded word, the same in every process"""
+    return zlib.crc32(data)
+
+
+class BloomFilter:
+    """Bit array answering "possibly stored" or "certainly not stored"
+
+    Backed by a bytearray while building and by a slice of the dictionary's
+    memory map once saved, so worker processes share it like the rest of the
+    file. Probe positions are derived from the word's table hash by double
+    hashing, so testing a word needs no second hash function.
+    """
+
+    def __init__(self, bits, hashes=BLOOM_HASHES):
+        self.bits = bits  # bytes-like, a power of two long
+        self.hashes = hashes
+        self.mask = len(bits) * 8 - 1
+
+    @classmethod
+    def build(cls, encoded, bits_per_word=BLOOM_BITS_PER_WORD, hashes=BLOOM_HASHES):
+        """Filter over a list of encoded words"""
+        size = 8
+        while size < len(encoded) * bits_per_word:
+            size *= 2
+        bloom = cls(bytearray(size // 8), hashes)
+        bits = bloom.bits
+        for data in encoded:
+            for position in bloom.positions(word_hash(data)):
+                bits[position >> 3] |= 1 << (position & 7)
+        return bloom
+
+    def positions(self, hash_value):
+        """Bit positions of a word with the given word_hash"""
+        step = ((hash_value >> 15) | (hash_value << 17)) & 0xFFFFFFFF | 1
+        mask = self.mask
+        return [(hash_value + i * step) & mask for i in range(self.hashes)]
+
+    def might_contain(self, hash_value):
+        """False if the word with this word_hash is certainly not stored"""
+        bits = self.bits
+        step = ((hash_value >> 15) | (hash_value << 17)) & 0xFFFFFFFF | 1
+        position = hash_value
+        for _ in range(self.hashes):
+            bit = position & self.mask
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+            position += step
+        return True
+
+
+class CompactDictionary:
+    """Word-frequency dictionary in a flat, memory-mappable layout
+
+    Words are stored sorted in one UTF-8 string table with an offset and a
+    frequency per word, and an open-addressing hash table of word ids finds
+    a word in about one probe. A saved dictionary is memory-mapped rather
+    than parsed, so loading it takes milliseconds and worker processes share
+    its pages instead of each holding a copy.
+
+    It stands in for SpellChecker wherever the engine only needs to know
+    which words are in the dictionary: known, unknown and candidates follow
+    SpellChecker's rules, word_frequency.load_words adds words at runtime,
+    and word_frequency.dictionary maps words to frequencies.
+    """
+
+    def __init__(self):
+        self.fingerprint = 0  # source_fingerprint of the word list
+        self.longest_word_length = 0
+        self.total_words = 0
+        self.word_offsets = array("I", [0])
+        self.frequencies = array("Q")
+        self.slots = array("I")  # Word id + 1 per slot, 0 if empty
+        self.mask = 0
+        self.bloom = None  # BloomFilter over the stored words, if built
+        self.prefilter = False  # Test words against bloom before the table
+        self.text = b""
+        self.view = None
+        self.mapping = None
+        self.path = None  # File the dictionary was loaded from or saved to
+
+        self.extra_words = set()  # Words added after loading
+        self._letters = None
+
+    @classmethod
+    def build(cls, frequencies, fingerprint=0, bloom_bits=BLOOM_BITS_PER_WORD):
+        """Build a dictionary from a {word: frequency} mapping
+
+        bloom_bits is the size of the Bloom filter prefilter in bits per
+        word, 0 to leave it out.
+        """
+        dictionary = cls()
+        dictionary.fingerprint = fingerprint
+
+        words = sorted(frequencies)
+        encoded = [word.encode("utf-8") for word in words]
+        offset = 0
+        for data in encoded:
+            offset += len(data)
+            dictionary.word_offsets.append(offset)
+        dictionary.frequencies = array("Q", (frequencies[word] for word in words))
+        dictionary.text = b"".join(encoded)
+        dictionary.longest_word_length = max(map(len, words), default=0)
+        dictionary.total_words = sum(dictionary.frequencies)
+
+        # At most half full, so a lookup rarely probes more than one slot
+        slot_count = 1
+        while slot_count < 2 * len(words):
+            slot_count *= 2
+        slots = array("I", bytes(4 * slot_count))
+        mask = slot_count - 1
+        for word_id, data in enumerate(encoded):
+            slot = word_hash(data) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = word_id + 1
+        dictionary.slots = slots
+        dictionary.mask = mask
+        if bloom_bits:
+            dictionary.bloom = BloomFilter.build(encoded, bloom_bits)
+        return dictionary
+
+    @classmethod
+    def load(cls, path, prefilter=False):
+        """Memory-map a saved dictionary, prefilter to test words with its bloom"""
+        with open(path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), length=0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            version,
+            word_count,
+            slot_count,
+            text_size,
+            longest_word_length,
+            bloom_size,
+            bloom_hashes,
+            total_words,
+            fingerprint,
+        ) = HEADER.unpack_from(mapping)
+        if magic != MAGIC or version != VERSION:
+            mapping.close()
+            raise ValueError(f"Not a compact dictionary: {path}")
+
+        dictionary = cls()
+        dictionary.fingerprint = fingerprint
+        dictionary.prefilter = prefilter
+        dictionary.longest_word_length = longest_word_length
+        dictionary.total_words = total_words
+        dictionary.mask = slot_count - 1
+        dictionary.path = path
+        dictionary.mapping = mapping
+        dictionary.view = view = memoryview(mapping)
+        position = HEADER.size
+        sections = [
+            ("frequencies", "Q", word_count),
+            ("word_offsets", "I", word_count + 1),
+            ("slots", "I", slot_count),
+        ]
+        for name, typecode, count in sections:
+            size = count * array(typecode).itemsize
+            setattr(dictionary, name, view[position : position + size].cast(typecode))
+            position += size
+        if bloom_size:
+            bits = view[position : position + bloom_size]
+            dictionary.bloom = BloomFilter(bits, bloom_hashes)
+            position += bloom_size
+        dictionary.text = view[position : position + text_size]
+        return dictionary
+
+    @classmethod
+    def load_or_build(cls, language="en", path=None, prefilter=False):
+        """Load the saved dictionary of a language, building it if out of date
+
+        Building parses pyspellchecker's word list once; every later start
+        only maps the saved file.
+        """
+        path = path or default_path(language)
+        fingerprint = source_fingerprint(language)
+        if os.path.exists(path):
+            try:
+                dictionary = cls.load(path, prefilter)
+                if dictionary.fingerprint == fingerprint:
+                    return dictionary
+                dictionary.close()
+            except (OSError, ValueError, struct.error):
+                pass
+
+        from spellchecker import SpellChecker
+
+        frequencies = SpellChecker(language=language).word_frequency.dictionary
+        dictionary = cls.build(frequencies, fingerprint)
+        dictionary.prefilter = prefilter
+        try:
+            dictionary.save(path)
+        except OSError as e:
+            print(f"Could not save compact dictionary: {e}")
+        return dictionary
+
+    def save(self, path):
+        """Write the dictionary to path in the memory-mappable layout"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    len(self.frequencies),
+                    len(self.slots),
+                    len(self.text),
+                    self.longest_word_length,
+                    len(self.bloom.bits) if self.bloom else 0,
+                    self.bloom.hashes if self.bloom else 0,
+                    self.total_words,
+                    self.fingerprint,
+                )
+            )
+            for table in (self.frequencies, self.word_offsets, self.slots):
+                file.write(memoryview(table).cast("B"))
+            if self.bloom:
+                file.write(self.bloom.bits)
+            file.write(self.text)
+        os.replace(temp_path, path)
+        self.path = path
+
+    def close(self):
+        """Release the memory map of a loaded dictionary"""
+        if self.mapping is not None:
+            for name in ("frequencies", "word_offsets", "slots", "text"):
+                getattr(self, name).release()
+            if self.bloom is not None:
+                self.bloom.bits.release()
+            self.view.release()
+            self.mapping.close()
+            self.mapping = None
+
+    def word_id(self, word):
+        """Id of a lowercase dictionary word, or -1 if it is not stored"""
+        return self.find(word.encode("utf-8"))
+
+    def find(self, data):
+        """Id of an encoded lowercase word, or -1 if it is not stored"""
+        slots, offsets, text = self.slots, self.word_offsets, self.text
+        if not slots:
+            return -1
+        hash_value = word_hash(data)
+        if self.prefilter and self.bloom and not self.bloom.might_contain(hash_value):
+            return -1
+        slot = hash_value & self.mask
+        while True:
+            entry = slots[slot]
+            if not entry:
+                return -1
+            start = offsets[entry - 1]
+            end = offsets[entry]
+            if end - start == len(data) and text[start:end] == data:
+                return entry - 1
+            slot = (slot + 1) & self.mask
+
+    def word(self, word_id):
+        """Dictionary word stored under word_id"""
+        start = self.word_offsets[word_id]
+        end = self.word_offsets[word_id + 1]
+        return str(self.text[start:end], "utf-8")
+
+    def should_check(self, word):
+        """Whether SpellChecker would check word at all, rather than skip it"""
+        if len(word) == 1 and word in NEVER_CHECKED:
+            return False
+        if len(word) > self.longest_word_length + 3:
+            return False
+        if word in NOT_NUMBERS:
+            return True
+        try:
+            float(word)
+            return False
+        except ValueError:
+            return True
+
+    def __contains__(self, word):
+        return word in self.extra_words or self.word_id(word) >= 0
+
+    def __getitem__(self, word):
+        word_id = self.word_id(word)
+        if word_id < 0:
+            if word in self.extra_words:
+                return 1
+            raise KeyError(word)
+        return self.frequencies[word_id]
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def __iter__(self):
+        for word_id in range(len(self.frequencies)):
+            yield self.word(word_id)
+
+    def values(self):
+        """Frequencies of the stored words, in word order"""
+        return self.frequencies
+
+    def known(self, words):
+        """The subset of words that are in the dictionary, lowercased"""
+        words = {word.lower() for word in words}
+        return {word for word in words if word in self and self.should_check(word)}
+
+    def unknown(self, words):
+        """The subset of words that are not in the dictionary, lowercased
+
+        ASCII words, most of any English text, are lowercased and tested as
+        bytes, which is exact for ASCII and skips the Unicode case tables;
+        an all-letter ASCII word cannot be a number or punctuation either,
+        so only the length rule of should_check applies to it.
+        """
+        unknown = set()
+        extra_words = self.extra_words
+        longest = self.longest_word_length + 3
+        for word in words:
+            data = word.encode("utf-8")
+            if data.isalpha():
+                data = data.lower()
+                if len(data) > longest or self.find(data) >= 0:
+                    continue
+                word = data.decode("ascii")
+            else:
+                word = word.lower()
+                if not self.should_check(word):
+                    continue
+                data = word.encode("utf-8")
+                if self.find(data) >= 0:
+                    continue
+            if word not in extra_words:
+                unknown.add(word)
+        return unknown
+
+    def letters(self):
+        """Every character used by a dictionary word"""
+        if self._letters is None:
+            self._letters = set(str(self.text, "utf-8"))
+        return self._letters
+
+    def edits(self, word):
+        """Strings one edit away from word, using only dictionary letters"""
+        letters = self.letters()
+        splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+        deletes = [left + right[1:] for left, right in splits if right]
+        transposes = [
+            left + right[1] + right[0] + right[2:]
+            for left, right in splits
+            if len(right) > 1
+        ]
+        replaces = [
+            left + char + right[1:]
+            for left, right in splits
+            if right
+            for char in letters
+        ]
+        inserts = [left + char + right for left, right in splits for char in letters]
+        return set(deletes + transposes + replaces + inserts)
+
+    def candidates(self, word):
+        """Known words one, or failing that two, edits away from word, or None"""
+        word = word.lower()
+        if word in self or not self.should_check(word):
+            return {word}
+        first = self.edits(word)
+        found = self.known(first)
+        if found:
+            return found
+        found = self.known(second for edit in first for second in self.edits(edit))
+        return found or None
+
+    # The engine reaches the word list through spell.word_frequency, as it
+    # does with SpellChecker, so both can be handed to it
+    @property
+    def word_frequency(self):
+        return self
+
+    @property
+    def dictionary(self):
+        return self
+
+    def load_words(self, words):
+        """Accept words as correctly spelled without rebuilding the dictionary"""
+        words = {word.lower() for word in words}
+        self.extra_words |= words
+        self.longest_word_length = max(
+            self.longest_word_length, max(map(len, words), default=0)
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the compact dictionary the spell checker memory-maps"
+    )
+    parser.add_argument("--language", default="en", help="dictionary language")
+    parser.add_argument("--output", default=None, help="dictionary path")
+    parser.add_argument(
+        "--bloom-bits",
+        type=int,
+        default=BLOOM_BITS_PER_WORD,
+        help="Bloom filter bits per word, 0 for none",
+    )
+    parser.add_argument("lookup", nargs="*", help="words to look up afterwards")
+    args = parser.parse_args(argv)
+    path = args.output or default_path(args.language)
+
+    from spellchecker import SpellChecker
+
+    start_time = time.perf_counter()
+    frequencies = SpellChecker(language=args.language).word_frequency.dictionary
+    parsed = time.perf_counter()
+    dictionary = CompactDictionary.build(
+        frequencies, source_fingerprint(args.language), args.bloom_bits
+    )
+    dictionary.save(path)
+    print(
+        f"Parsed {len(frequencies):,} words in {parsed - start_time:.2f}s, "
+        f"built in {time.perf_counter() - parsed:.2f}s -> {path}"
+    )
+
+    start_time = time.perf_counter()
+    dictionary = CompactDictionary.load(path)
+    print(f"Loaded in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+    for word in args.lookup:
+        verdict = "known" if dictionary.known([word]) else "unknown"
+        print(f"{word}: {verdict}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import html
+import re
+import time
+
+from SpellEngine import snap_boundary, tokenize
+
+# Exports read, mark up and write the document this many bytes or characters
+# at a time, cut at whitespace so no word is split between two pieces
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+TEXT_WHITESPACE_RE = re.compile(r"\s")
+
+HTML_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+    <title>{title}</title>
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            line-height: 1.6;
+            margin: 20px;
+            background-color: #f9f9f9;
+        }}
+        .container {{
+            background-color: white;
+            padding: 20px;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }}
+        .header {{
+            border-bottom: 2px solid #333;
+            padding-bottom: 10px;
+            margin-bottom: 20px;
+        }}
+        .content {{
+            font-size: 14px;
+            line-height: 1.8;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>{title}</h1>
+            <p>Generated on {generated}</p>
+        </div>
+        <div class="content">
+            """
+
+HTML_TAIL = """
+        </div>
+    </div>
+</body>
+</html>"""
+
+HTML_MARKS = {
+    "original": '<strong style="color: red; background-color: #ffcccc;">',
+    "corrected": '<strong style="color: green; background-color: #ccffcc;">',
+}
+
+TEXT_MARKS = {
+    "original": ("**", "**"),  # Errors are marked **word**
+    "corrected": (">>", "<<"),  # Corrections are marked >>word<<
+}
+
+
+def document_chunks(document, original=False):
+    """Yield the document's text a piece at a time, each cut after whitespace
+
+    The original text, or current text that was never modified, is decoded
+    straight from the (memory-mapped) buffer one piece at a time, so only a
+    piece is held in memory however large the file is.
+    """
+    if original or not document.modified:
+        buffer = document.buffer
+        start = 0
+        while start < len(buffer):
+            end = snap_boundary(buffer, start + EXPORT_CHUNK_SIZE)
+            yield str(memoryview(buffer)[start:end], "utf-8", "replace")
+            start = end
+        return
+
+    text = document.text
+    start = 0
+    while start < len(text):
+        match = TEXT_WHITESPACE_RE.search(text, start + EXPORT_CHUNK_SIZE)
+        end = match.end() if match else len(text)
+        yield text[start:end]
+        start = end
+
+
+def escape_html(text):
+    """Escape the characters that are special in HTML text"""
+    return html.escape(text, quote=False)
+
+
+def mark_words(chunk, words, before, after, escape=str):
+    """Wrap every word of chunk whose lowercase form is in words, keeping its case"""
+    parts = []
+    position = 0
+    for word, start, end in tokenize(chunk):
+        if word.lower() in words:
+            parts.append(escape(chunk[position:start]))
+            parts.append(before)
+            parts.append(escape(chunk[start:end]))
+            parts.append(after)
+            position = end
+    parts.append(escape(chunk[position:]))
+    return "".join(parts)
+
+
+def export_html(path, chunks, words, doc_type="original"):
+    """Write chunks to path as HTML with words highlighted, in one streaming pass"""
+    title = (
+        "Original Document with Errors"
+        if doc_type == "original"
+        else "Corrected Document"
+    )
+    words = {word.lower() for word in words}
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(
+            HTML_HEAD.format(title=title, generated=time.strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        for chunk in chunks:
+            marked = mark_words(
+                chunk, words, HTML_MARKS[doc_type], "</strong>", escape_html
+            )
+            # Convert newlines to HTML breaks
+            file.write(marked.replace("\n", "<br>\n"))
+        file.write(HTML_TAIL)
+
+
+def export_marked_text(path, chunks, words, marker_type="original"):
+    """Write chunks to path as plain text with words marked, in one streaming pass"""
+    header = f"""
+{'='*50}
+{'ORIGINAL DOCUMENT WITH ERRORS' if marker_type == 'original' else 'CORRECTED DOCUMENT'}
+Generated on {time.strftime('%Y-%m-%d %H:%M:%S')}
+{'**word** = misspelled word' if marker_type == 'original' else '>>word<< = corrected word'}
+{'='*50}
+
+"""
+    before, after = TEXT_MARKS[marker_type]
+    words = {word.lower() for word in words}
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(header)
+        for chunk in chunks:
+            file.write(mark_words(chunk, words, before, after))
+
@@ -0,0 +1,399 @@
+import tkinter as tk
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from SpellEngine import ASTRAL_RE, line_starts, text_index
+
+# Documents larger than this many bytes are shown a window at a time
+WINDOWED_VIEW_THRESHOLD = 16 * 1024 * 1024
+
+# Lines loaded into the text widget at once, and how close to either edge of
+# the window the view may scroll before the window is moved
+WINDOW_LINES = 2000
+WINDOW_MARGIN = 200
+
+# Beyond this many edits the text box is refilled instead of edited in place
+IN_PLACE_EDIT_LIMIT = 5000
+
+# Tcl procedure standing in for the text widget's command. It reports edits
+# to Python first and then runs the real command, so its errors reach the
+# caller as they are: Tk's own bindings rely on them, e.g. copy and cut
+# catch the error of reading a selection that is not there
+PROXY_PROC = """
+proc %(widget)s args {
+    if {[lindex $args 0] in {insert delete replace}} {
+        %(note)s {*}$args
+    }
+    tailcall %(inner)s {*}$args
+}
+"""
+
+
+class DocumentView:
+    """Shows a Document in a Text widget, a window of lines at a time if large
+
+    Small documents are inserted whole and can be edited as before. A large
+    document is read-only: only WINDOW_LINES lines around the current
+    position are decoded and inserted, the vertical scrollbar is mapped onto
+    the whole document, and more is paged in as the view nears an edge of
+    the window. Misspelled spans are kept as global character offsets and
+    only those inside the window are tagged.
+
+    Edits typed into a full view are tracked as a range of dirty lines, so
+    sync only has to copy those lines back into the document.
+    """
+
+    def __init__(self, text_widget, scrollbar, tag="misspelled"):
+        self.text_widget = text_widget
+        self.scrollbar = scrollbar
+        self.tag = tag
+        self.document = None
+        self.windowed = False
+
+        # Current window: 0-based lines [first_line, last_line) starting at
+        # character offset window_offset, with the window's own line starts,
+        # and its text if that holds characters Tk counts as two columns
+        self.first_line = 0
+        self.last_line = 0
+        self.window_offset = 0
+        self.window_end = 0
+        self.window_starts = [0]
+        self.window_text = None
+        self.moving = False
+
+        self.spans = []  # Sorted (start, end) spans to highlight
+        self.spans_sorted = True
+
+        # (first, last) 0-based lines edited since the last sync, in the
+        # text box's current numbering, and a callback for every user edit
+        self.dirty = None
+        self.on_edit = None
+        self.untracked_depth = 0
+
+        text_widget.configure(yscrollcommand=self.on_text_scroll)
+        scrollbar.configure(command=self.on_scrollbar)
+
+        # Route the widget's Tcl command through PROXY_PROC to see every edit
+        self.widget_command = f"{text_widget._w}_inner"
+        text_widget.tk.call("rename", text_widget._w, self.widget_command)
+        text_widget.tk.eval(
+            PROXY_PROC
+            % {
+                "widget": text_widget._w,
+                "note": text_widget.register(self.on_command),
+                "inner": self.widget_command,
+            }
+        )
+
+    def on_command(self, *args):
+        """Note which lines an insert, delete or replace about to run touches"""
+        if self.untracked_depth > 0 or self.windowed:
+            return
+        try:
+            self.note_edit(*args)
+        except tk.TclError:
+            pass  # A bad index, which the command itself reports
+
+    def line(self, index):
+        """0-based line number of a text widget index"""
+        index = self.text_widget.tk.call(self.widget_command, "index", index)
+        return int(index.split(".")[0]) - 1
+
+    def note_edit(self, command, index, *args):
+        """Grow the dirty range by an insert, delete or replace about to run"""
+        if command in ("delete", "replace"):
+            first = self.line(index)
+            if command == "delete" and not args:
+                last = self.line(f"{index} +1c")
+            else:
+                last = self.line(args[0])
+            # The final newline of the text box can never be deleted
+            last = min(last, self.line("end-1c"))
+            removed = last - first
+            if self.dirty is not None:
+                self.dirty = tuple(
+                    line if line <= first else max(first, line - removed)
+                    for line in self.dirty
+                )
+            self.mark_dirty(first, first)
+            if command == "replace":
+                self.note_edit("insert", index, *args[1:])
+                return
+        else:
+            first = self.line(index)
+            added = "".join(args[0::2]).count("\n")
+            if self.dirty is not None:
+                dirty_first, dirty_last = self.dirty
+                self.dirty = (
+                    dirty_first if dirty_first <= first else dirty_first + added,
+                    dirty_last + added if dirty_last >= first else dirty_last,
+                )
+            self.mark_dirty(first, first + added)
+
+        if self.on_edit is not None:
+            self.on_edit()
+
+    def mark_dirty(self, first, last):
+        """Add lines first to last to the dirty range"""
+        if self.dirty is not None:
+            first = min(first, self.dirty[0])
+            last = max(last, self.dirty[1])
+        self.dirty = (first, last)
+
+    @contextmanager
+    def untracked(self):
+        """Change the text box without the changes counting as user edits"""
+        self.untracked_depth += 1
+        try:
+            yield
+        finally:
+            self.untracked_depth -= 1
+
+    def sync(self):
+        """Copy the lines typed over since the last sync into the document
+
+        Returns the (start, end, replacement) edit applied to the document,
+        with offsets from before it, and the text it replaced, or None if
+        nothing was typed.
+        """
+        if self.dirty is None or self.document is None:
+            return None
+        first, last = self.dirty
+        self.dirty = None
+
+        # Every change is inside the dirty lines, so the lines after them
+        # only moved by the difference in line count
+        starts = self.document.line_starts
+        length = self.document.length
+        widget_lines = self.line("end-1c") + 1
+        last = min(last, widget_lines - 1)
+        first = min(first, last)
+        old_last = max(first - 1, last - (widget_lines - len(starts)))
+
+        def line_start(line):
+            return starts[line] if line < len(starts) else length
+
+        start = line_start(first)
+        end = line_start(old_last + 1)
+        new_end = f"{last + 2}.0" if last + 1 < widget_lines else "end-1c"
+        replacement = self.text_widget.get(f"{first + 1}.0", new_end)
+
+        edit = (start, end, replacement)
+        removed = self.document.chars[start:end]
+        self.document.apply_edits([edit])
+        self.window_is_document()
+        return edit, removed
+
+    def retag(self, start, end, spans):
+        """Replace the highlights between two offsets, e.g. of re-checked lines"""
+        self.text_widget.tag_remove(self.tag, self.index(start), self.index(end))
+        self.tag_spans(spans)
+
+    def show(self, document, keep_position=False):
+        """Display a document, windowed if it is too large to insert whole"""
+        top_line = self.top_line() if keep_position else 0
+        self.document = document
+        self.windowed = document.size > WINDOWED_VIEW_THRESHOLD
+        self.dirty = None
+
+        with self.untracked():
+            self.text_widget.configure(state="normal")
+            self.text_widget.delete("1.0", tk.END)
+            if self.windowed:
+                self.load_window(top_line)
+                self.text_widget.configure(state="disabled")
+            else:
+                # Offsets keep line endings as they are on disk, only CRLF is
+                # folded for display, which leaves every column unchanged
+                self.text_widget.insert(tk.END, document.text.replace("\r\n", "\n"))
+                self.text_widget.yview(f"{top_line + 1}.0")
+                self.window_is_document()
+
+    def window_is_document(self):
+        """Make the window the whole text, as in a full view"""
+        document = self.document
+        self.first_line = 0
+        self.last_line = len(document.line_starts)
+        self.window_offset = 0
+        self.window_end = document.length
+        self.window_starts = document.line_starts
+        self.window_text = document.chars if document.astral else None
+
+    def set_editable(self, editable):
+        """Allow typing into a full view or not, e.g. not while a run reads it"""
+        if not self.windowed:
+            self.text_widget.configure(state="normal" if editable else "disabled")
+
+    def apply_edits(self, edits):
+        """Apply (start, end, replacement) edits to the document and the view
+
+        A full view rewrites only the edited ranges, which keeps the scroll
+        position and the highlights of untouched words; a windowed view, or
+        one with too many edits, loads its text again. Returns True in that
+        case, as the highlights then have to be added again.
+        """
+        if self.windowed or len(edits) > IN_PLACE_EDIT_LIMIT:
+            self.document.apply_edits(edits)
+            self.show(self.document, keep_position=True)
+            return True
+
+        # Indices into the text as it is before the edit
+        indices = [
+            (self.index(start), self.index(end), replacement)
+            for start, end, replacement in edits
+        ]
+        self.document.apply_edits(edits)
+
+        # Back to front, so the indices of earlier edits stay valid
+        with self.untracked():
+            for start, end, replacement in reversed(indices):
+                self.text_widget.delete(start, end)
+                self.text_widget.insert(start, replacement)
+        self.window_is_document()
+        return False
+
+    def clear(self):
+        """Remove the document from the view"""
+        self.document = None
+        self.windowed = False
+        self.spans = []
+        self.spans_sorted = True
+        self.dirty = None
+        with self.untracked():
+            self.text_widget.configure(state="normal")
+            self.text_widget.delete("1.0", tk.END)
+
+    def load_window(self, top_line):
+        """Decode and insert the lines around top_line, then tag their spans"""
+        line_count = self.document.line_count
+        first = max(0, min(top_line - WINDOW_MARGIN, line_count - WINDOW_LINES))
+        last = min(line_count, first + WINDOW_LINES)
+        text, offset = self.document.lines(first, last)
+
+        self.moving = True
+        self.untracked_depth += 1
+        try:
+            self.text_widget.configure(state="normal")
+            self.text_widget.delete("1.0", tk.END)
+            self.text_widget.insert(tk.END, text.replace("\r\n", "\n"))
+            self.text_widget.configure(state="disabled")
+
+            self.first_line = first
+            self.last_line = last
+            self.window_offset = offset
+            self.window_end = offset + len(text)
+            self.window_starts = line_starts(text)
+            self.window_text = text if ASTRAL_RE.search(text) else None
+            self.tag_window()
+            self.text_widget.yview(f"{top_line - first + 1}.0")
+        finally:
+            self.moving = False
+            self.untracked_depth -= 1
+        self.update_scrollbar()
+
+    def top_line(self):
+        """0-based document line shown at the top of the view"""
+        local_line = int(self.text_widget.index("@0,0").split(".")[0]) - 1
+        return local_line + (self.first_line if self.windowed else 0)
+
+    def visible_lines(self):
+        """Number of lines the view currently shows"""
+        bottom = self.text_widget.index(f"@0,{self.text_widget.winfo_height()}")
+        top = self.text_widget.index("@0,0")
+        return max(1, int(bottom.split(".")[0]) - int(top.split(".")[0]) + 1)
+
+    def covers(self, line):
+        """Whether line can be at the top without nearing an edge of the window"""
+        if line < self.first_line or line >= self.last_line:
+            return False
+        near_top = line - self.first_line < WINDOW_MARGIN and self.first_line > 0
+        near_bottom = (
+            self.last_line - line - self.visible_lines() < WINDOW_MARGIN
+            and self.last_line < self.document.line_count
+        )
+        return not (near_top or near_bottom)
+
+    def scroll_to(self, line):
+        """Scroll so a 0-based document line is at the top"""
+        line = max(0, min(line, self.document.line_count - 1))
+        if self.covers(line):
+            self.text_widget.yview(f"{line - self.first_line + 1}.0")
+        else:
+            self.load_window(line)
+
+    def on_scrollbar(self, *args):
+        """Scrollbar moved: map it onto the whole document when windowed"""
+        if not self.windowed:
+            self.text_widget.yview(*args)
+            return
+
+        if args[0] == "moveto":
+            line = int(float(args[1]) * self.document.line_count)
+        else:
+            amount, what = int(args[1]), args[2]
+            step = self.visible_lines() if what == "pages" else 1
+            line = self.top_line() + amount * step
+        self.scroll_to(line)
+
+    def on_text_scroll(self, first, last):
+        """The text widget scrolled itself, e.g. by mouse wheel or keyboard"""
+        if not self.windowed:
+            self.scrollbar.set(first, last)
+            return
+        self.update_scrollbar()
+        if not self.moving:
+            # Page in more lines once the view nears an edge of the window
+            self.text_widget.after_idle(self.follow_view)
+
+    def follow_view(self):
+        """Move the window if the view has come close to one of its edges"""
+        if self.windowed and self.document is not None:
+            top_line = self.top_line()
+            if not self.covers(top_line):
+                self.load_window(top_line)
+
+    def update_scrollbar(self):
+        """Show the view's position within the whole document"""
+        line_count = max(1, self.document.line_count)
+        top = self.top_line()
+        self.scrollbar.set(top / line_count, (top + self.visible_lines()) / line_count)
+
+    def set_spans(self, spans):
+        """Replace the highlighted spans, given sorted by start offset"""
+        self.spans = spans
+        self.spans_sorted = True
+        self.tag_window()
+
+    def add_spans(self, spans):
+        """Highlight more spans, e.g. from a chunk that just finished"""
+        if self.windowed:
+            # Kept to tag again when the window moves
+            self.spans.extend(spans)
+            self.spans_sorted = False
+        self.tag_spans(spans)
+
+    def tag_window(self):
+        """Tag the spans that fall inside the current window"""
+        self.text_widget.tag_remove(self.tag, "1.0", tk.END)
+        if not self.spans_sorted:
+            self.spans.sort()
+            self.spans_sorted = True
+        first = bisect_left(self.spans, (self.window_offset,))
+        last = bisect_left(self.spans, (self.window_end,))
+        self.tag_spans(self.spans[first:last])
+
+    def tag_spans(self, spans):
+        """Add the tag to the spans inside the window in one call"""
+        indices = []
+        for start, end in spans:
+            if start >= self.window_offset and end <= self.window_end:
+                indices.append(self.index(start))
+                indices.append(self.index(end))
+        if indices:
+            self.text_widget.tag_add(self.tag, *indices)
+
+    def index(self, offset):
+        """Tk index in the window of a document character offset"""
+        return text_index(
+            self.window_starts, offset - self.window_offset, self.window_text
+        )
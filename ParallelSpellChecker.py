@@ -1,14 +1,43 @@
 import threading
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from spellchecker import SpellChecker
-import mmap
-import re
-import time
+from SpellEngine import (
+    BACKENDS,
+    Document,
+    EditJournal,
+    OccurrenceIndex,
+    SpellEngine,
+    correction_edits,
+    shift_spans,
+    tokenize,
+)
+from DocumentView import DocumentView
+from DocumentExport import document_chunks, export_html, export_marked_text
 import queue
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+from SuggestionIndex import SuggestionCache, SuggestionIndex
+from ResultCache import ResultCache
+from RunTrace import run_trace, write_chrome_trace, write_trace
+from bisect import bisect_left
 from collections import Counter
+from contextlib import contextmanager
+
+# Number of misspelled ranges tagged per idle callback when highlighting
+HIGHLIGHT_BATCH = 2000
+
+# Suggestion lists kept in memory, and how many of the most frequent
+# misspelled words get their suggestions computed right after a run
+SUGGESTION_CACHE_SIZE = 2048
+PREWARM_WORDS = 200
+SUGGESTION_COUNT = 10
+
+# Typed edits are re-checked once typing pauses for this many milliseconds
+RECHECK_DELAY = 300
+
+# Auto-correct only applies suggestions rated at least this confident,
+# everything else is left in the list for manual review
+AUTO_CORRECT_CONFIDENCE = 0.9
 
 
 class SpellCheckerApp:
@@ -18,21 +47,55 @@ class SpellCheckerApp:
         self.root.geometry("1200x800")
         self.root.configure(bg="#f0f0f0")
 
-        # Initialize spell checker
-        self.spell = SpellChecker()
+        # Initialize the headless engine. It loads the dictionary on a
+        # background thread, so the window shows up and files open while
+        # that finishes. The on-disk result cache is opened once it is
+        # switched on: with it, chunks are cut where the content says rather
+        # than sized from the measured throughput
+        self.result_cache = None
+        self.engine = SpellEngine()
+        self.start_pending = False  # Check requested before the dictionary was ready
+
+        # Suggestion index, loaded from disk (or built once) in the background
+        self.suggestion_index = None
+        self.suggestion_cache = SuggestionCache(
+            self.get_suggestions, maxsize=SUGGESTION_CACHE_SIZE
+        )
+        self.prewarm_stop = threading.Event()
+        threading.Thread(target=self.load_suggestion_index, daemon=True).start()
         self.results = []
         self.misspelled_words = set()
+        # Spans of misspelled words, read through the occurrences property.
+        # Typed edits are recorded in the index rather than moving all spans
+        self.occurrence_index = OccurrenceIndex()
+        self.word_counts = Counter()  # {misspelled word: occurrences}
+
+        # While a run streams in or typed edits are re-checked, the results
+        # list is updated in place: new words are appended, the lines of
+        # changed words rewritten and those of corrected words removed
+        self.listed = {}  # {word: 1-based line in the results list}
+        self.changed_words = set()  # Words whose count changed since then
         self.current_file_path = None
+        self.document = None  # Loaded Document, read once and shared by all stages
         self.processing = False
+        self.exports = 0  # Exports still reading the document on worker threads
 
-        # Store original text for comparison
-        self.original_text = ""
+        # The original text stays in document.buffer, as read from disk
         self.corrected_words = {}  # Track corrections made {original: corrected}
+        self.journal = EditJournal()  # Undo/redo history of applied corrections
+
+        # Result of the last finished run and the time the GUI spent showing
+        # it, measured only until the run and its highlighting are done
+        self.last_result = None
+        self.ui_timings = {"highlight": 0.0, "ui": 0.0}
+        self.timing_run = False
+
+        self.highlight_generation = 0
+        self.highlight_pending = False  # Background highlight batches still due
+        self.recheck_job = None  # Pending re-check of typed edits
 
         # Thread management
-        self.executor = None
         self.progress_queue = queue.Queue()
-        self.cancel_event = threading.Event()
 
         # Statistics - Added execution_time
         self.stats = {
@@ -41,6 +104,9 @@ class SpellCheckerApp:
             "processing_time": 0,
             "execution_time": 0,  # NEW: Total execution time
             "threads_used": 0,
+            "backend": "thread",
+            "cache_hits": 0,
+            "cache_misses": 0,
         }
 
         # Track currently selected word for ignore functionality
@@ -50,6 +116,21 @@ class SpellCheckerApp:
         self.create_widgets()
         self.setup_layout()
 
+        if not self.engine.ready.done():
+            self.progress_label.config(text="Loading dictionary...")
+        self.engine.ready.add_done_callback(
+            lambda future: self.root.after(0, self.dictionary_loaded)
+        )
+
+    @property
+    def occurrences(self):
+        """{misspelled word: [(start, end), ...]} in offsets of the current text"""
+        return self.occurrence_index.current()
+
+    @occurrences.setter
+    def occurrences(self, occurrences):
+        self.occurrence_index = OccurrenceIndex(occurrences)
+
     def setup_styles(self):
         """Configure custom styles for ttk widgets"""
         style = ttk.Style()
@@ -100,6 +181,12 @@ class SpellCheckerApp:
             command=self.download_corrected,
             style="Custom.TButton",
         )
+        self.export_trace_button = ttk.Button(
+            self.download_frame,
+            text="📈 Export Trace",
+            command=self.export_trace,
+            style="Custom.TButton",
+        )
 
         self.clear_button = ttk.Button(
             self.control_frame,
@@ -112,7 +199,24 @@ class SpellCheckerApp:
         self.thread_label = ttk.Label(self.control_frame, text="Threads:")
         self.thread_var = tk.StringVar(value="4")
         self.thread_spinbox = ttk.Spinbox(
-            self.control_frame, from_=1, to=16, textvariable=self.thread_var, width=5
+            self.control_frame, from_=1, to=64, textvariable=self.thread_var, width=5
+        )
+
+        # Worker backend: threads share the GIL, processes scale with cores
+        self.backend_label = ttk.Label(self.control_frame, text="Backend:")
+        self.backend_var = tk.StringVar(value="thread")
+        self.backend_combobox = ttk.Combobox(
+            self.control_frame,
+            values=BACKENDS,
+            textvariable=self.backend_var,
+            state="readonly",
+            width=8,
+        )
+
+        # Answer unchanged chunks from the on-disk result cache
+        self.cache_var = tk.BooleanVar(value=False)
+        self.cache_checkbutton = ttk.Checkbutton(
+            self.control_frame, text="Cache results", variable=self.cache_var
         )
 
         self.process_button = ttk.Button(
@@ -162,18 +266,17 @@ class SpellCheckerApp:
             relief="sunken",
             bd=2,
         )
-        self.text_scrollbar_v = ttk.Scrollbar(
-            self.text_scroll_frame, orient="vertical", command=self.full_text_box.yview
-        )
+        self.text_scrollbar_v = ttk.Scrollbar(self.text_scroll_frame, orient="vertical")
         self.text_scrollbar_h = ttk.Scrollbar(
             self.text_scroll_frame,
             orient="horizontal",
             command=self.full_text_box.xview,
         )
-        self.full_text_box.configure(
-            yscrollcommand=self.text_scrollbar_v.set,
-            xscrollcommand=self.text_scrollbar_h.set,
-        )
+        self.full_text_box.configure(xscrollcommand=self.text_scrollbar_h.set)
+
+        # Large documents are paged into the text box a window at a time
+        self.view = DocumentView(self.full_text_box, self.text_scrollbar_v)
+        self.view.on_edit = self.on_text_edit
 
         # Results frame
         self.results_frame = ttk.LabelFrame(
@@ -241,9 +344,42 @@ class SpellCheckerApp:
             self.suggestions_frame, text="Ignore Word", command=self.ignore_word
         )
 
+        # Bulk auto-correct with its confidence threshold
+        self.auto_correct_button = ttk.Button(
+            self.suggestions_frame,
+            text="✨ Auto-Correct All",
+            command=self.auto_correct,
+        )
+        self.confidence_label = ttk.Label(self.suggestions_frame, text="Confidence:")
+        self.confidence_var = tk.StringVar(value=str(AUTO_CORRECT_CONFIDENCE))
+        self.confidence_spinbox = ttk.Spinbox(
+            self.suggestions_frame,
+            from_=0.0,
+            to=1.0,
+            increment=0.05,
+            textvariable=self.confidence_var,
+            width=5,
+        )
+
+        # Undo and redo of applied corrections
+        self.undo_button = ttk.Button(
+            self.suggestions_frame,
+            text="↶ Undo",
+            command=self.undo_correction,
+            state="disabled",
+        )
+        self.redo_button = ttk.Button(
+            self.suggestions_frame,
+            text="↷ Redo",
+            command=self.redo_correction,
+            state="disabled",
+        )
+
         # Bind events
         self.misspelled_text_box.bind("<Double-Button-1>", self.on_word_select)
         self.suggestions_listbox.bind("<Double-Button-1>", self.apply_correction)
+        self.root.bind("<Control-z>", self.undo_correction)
+        self.root.bind("<Control-y>", self.redo_correction)
 
     def setup_layout(self):
         """Arrange widgets using grid layout"""
@@ -262,6 +398,7 @@ class SpellCheckerApp:
         self.download_frame.grid(row=0, column=1, padx=5, pady=5)
         self.download_original_button.pack(side="left", padx=2)
         self.download_corrected_button.pack(side="left", padx=2)
+        self.export_trace_button.pack(side="left", padx=2)
 
         self.clear_button.grid(row=0, column=2, padx=5, pady=5)
 
@@ -271,8 +408,11 @@ class SpellCheckerApp:
 
         self.thread_label.grid(row=0, column=4, padx=5, pady=5)
         self.thread_spinbox.grid(row=0, column=5, padx=5, pady=5)
-        self.process_button.grid(row=0, column=6, padx=5, pady=5)
-        self.cancel_button.grid(row=0, column=7, padx=5, pady=5)
+        self.backend_label.grid(row=0, column=6, padx=5, pady=5)
+        self.backend_combobox.grid(row=0, column=7, padx=5, pady=5)
+        self.cache_checkbutton.grid(row=0, column=8, padx=5, pady=5)
+        self.process_button.grid(row=0, column=9, padx=5, pady=5)
+        self.cancel_button.grid(row=0, column=10, padx=5, pady=5)
 
         # Progress frame
         self.progress_frame.grid(
@@ -325,6 +465,11 @@ class SpellCheckerApp:
         self.suggestions_scrollbar.grid(row=1, column=2, sticky="ns", pady=2)
         self.correct_button.grid(row=2, column=0, padx=2, pady=2, sticky="ew")
         self.ignore_button.grid(row=2, column=1, padx=2, pady=2, sticky="ew")
+        self.auto_correct_button.grid(row=3, column=0, padx=2, pady=2, sticky="ew")
+        self.confidence_label.grid(row=3, column=1, padx=2, pady=2, sticky="e")
+        self.confidence_spinbox.grid(row=3, column=2, padx=2, pady=2, sticky="w")
+        self.undo_button.grid(row=4, column=0, padx=2, pady=2, sticky="ew")
+        self.redo_button.grid(row=4, column=1, padx=2, pady=2, sticky="ew")
 
         self.suggestions_frame.columnconfigure(0, weight=1)
         self.suggestions_frame.columnconfigure(1, weight=1)
@@ -341,138 +486,154 @@ class SpellCheckerApp:
 
         self.results_frame.rowconfigure(0, weight=1)
 
-    def process_chunk(self, text, chunk_id, progress_callback):
-        """Process a chunk of text for spell checking"""
-        if self.cancel_event.is_set():
-            return chunk_id, set()
-
-        # Remove punctuation around words before checking
-        cleaned_words = [
-            re.sub(r"^\W+|\W+$", "", word) for word in text.split() if word.strip()
-        ]
-        misspelled = self.spell.unknown(cleaned_words)
+    def spell_check_parallel(self, document, num_threads):
+        """Main spell checking function with parallel processing
 
-        # Report progress
-        progress_callback(chunk_id)
+        Runs on a background thread. Each chunk's misspelled words are sent
+        through progress_queue as soon as the chunk is done, so the UI can
+        show them while the rest of the document is still being checked.
+        """
 
-        return chunk_id, misspelled
+        def progress_callback(completed, total):
+            self.progress_queue.put(("progress", (completed, total)))
 
-    def divide_text(self, file_path, num_chunks):
-        """Divide text into chunks for parallel processing"""
-        chunks = []
-        try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                with mmap.mmap(file.fileno(), length=0, access=mmap.ACCESS_READ) as m:
-                    text = m.read().decode("utf-8")
-                    lines = text.splitlines()
-
-                    if not lines:
-                        return []
-
-                    chunk_size = max(1, len(lines) // num_chunks)
-                    for i in range(num_chunks):
-                        start = i * chunk_size
-                        end = start + chunk_size if i < num_chunks - 1 else len(lines)
-                        chunk_text = "\n".join(lines[start:end])
-                        if chunk_text.strip():  # Only add non-empty chunks
-                            chunks.append(chunk_text)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to read file: {str(e)}")
-
-        return chunks
-
-    def spell_check_parallel(self, file_path, num_threads):
-        """Main spell checking function with parallel processing"""
-        self.results.clear()
-        self.misspelled_words.clear()
-        self.cancel_event.clear()
-
-        # Track total execution time
-        total_start_time = time.time()
-        start_time = time.time()
+        def chunk_callback(chunk):
+            self.progress_queue.put(("chunk", chunk))
 
         try:
-            chunks = self.divide_text(file_path, num_threads)
-            if not chunks:
-                return set()
-
-            self.progress_bar["maximum"] = len(chunks)
-            self.progress_bar["value"] = 0
-
-            completed_chunks = 0
-
-            def progress_callback(chunk_id):
-                nonlocal completed_chunks
-                completed_chunks += 1
-                self.progress_queue.put(("progress", completed_chunks))
-
-            # Use ThreadPoolExecutor for better thread management
-            with ThreadPoolExecutor(max_workers=num_threads) as executor:
-                self.executor = executor
-
-                # Submit all tasks
-                future_to_chunk = {
-                    executor.submit(self.process_chunk, chunk, i, progress_callback): i
-                    for i, chunk in enumerate(chunks)
-                }
-
-                # Collect results as they complete
-                for future in as_completed(future_to_chunk):
-                    if self.cancel_event.is_set():
-                        break
-
-                    try:
-                        chunk_id, misspelled = future.result()
-                        self.results.append((chunk_id, misspelled))
-                        self.misspelled_words.update(misspelled)
-                    except Exception as e:
-                        print(f"Error processing chunk: {e}")
+            result = self.engine.check(
+                document,
+                num_workers=num_threads,
+                progress_callback=progress_callback,
+                chunk_callback=chunk_callback,
+            )
 
             # Calculate statistics
-            with open(file_path, "r", encoding="utf-8") as file:
-                full_text = file.read()
-                self.stats["total_words"] = len(full_text.split())
-
-            self.stats["misspelled_count"] = len(self.misspelled_words)
-            self.stats["processing_time"] = time.time() - start_time
-            self.stats["execution_time"] = (
-                time.time() - total_start_time
-            )  # NEW: Total execution time
+            self.stats["total_words"] = result["total_words"]
+            self.stats["misspelled_count"] = len(result["misspelled"])
+            self.stats["processing_time"] = result["timings"]["check"]
+            self.stats["execution_time"] = result["timings"]["total"]
             self.stats["threads_used"] = num_threads
+            self.stats["backend"] = result["backend"]
+            self.stats["cache_hits"] = result["cache"]["hits"]
+            self.stats["cache_misses"] = result["cache"]["misses"]
 
-            return self.misspelled_words
+            return result
 
         except Exception as e:
             messagebox.showerror("Error", f"Spell checking failed: {str(e)}")
-            return set()
+            return None
+
+    def highlight_text(self, text_widget, occurrences):
+        """Highlight misspelled words from their offsets, visible lines first"""
+        if not self.processing:
+            self.timing_run = False  # A new pass after the run, e.g. a correction
+        with self.timed("highlight"):
+            self.highlight_generation += 1
+            text_widget.tag_remove("misspelled", "1.0", tk.END)
+
+            # Configure highlighting style
+            text_widget.tag_config(
+                "misspelled", background="#ffcccc", foreground="red", underline=True
+            )
+
+            spans = sorted(
+                span for word_spans in occurrences.values() for span in word_spans
+            )
+            if self.view.windowed:
+                self.view.set_spans(spans)  # Only the window on screen is tagged
+                return
+            if not spans:
+                return
 
-    def highlight_text(self, text_widget, misspelled_words):
-        """Highlight misspelled words in the text widget"""
-        text_widget.tag_remove("misspelled", "1.0", tk.END)
+            # Tag what is on screen right away and the rest in the background
+            first_line = int(text_widget.index("@0,0").split(".")[0])
+            last_line = int(
+                text_widget.index(f"@0,{text_widget.winfo_height()}").split(".")[0]
+            )
+            first = bisect_left(spans, (self.line_offset(first_line),))
+            last = bisect_left(spans, (self.line_offset(last_line + 1),))
+            self.view.tag_spans(spans[first:last])
+
+            remaining = spans[last:] + spans[:first]
+            self.highlight_pending = True
+            self.root.after_idle(
+                self.highlight_batch,
+                text_widget,
+                remaining,
+                0,
+                self.highlight_generation,
+            )
 
-        for word in misspelled_words:
-            start_index = "1.0"
-            while True:
-                # Use word boundaries for more accurate matching
-                start_index = text_widget.search(
-                    f"\\m{re.escape(word)}\\M", start_index, tk.END, regexp=True
-                )
-                if not start_index:
-                    break
-                end_index = f"{start_index} + {len(word)}c"
-                text_widget.tag_add("misspelled", start_index, end_index)
-                start_index = end_index
+    def highlight_batch(self, text_widget, spans, position, generation):
+        """Tag the next batch of misspelled ranges until all are highlighted"""
+        if generation != self.highlight_generation:
+            return  # A newer highlight pass has started
+
+        with self.timed("highlight"):
+            self.view.tag_spans(spans[position : position + HIGHLIGHT_BATCH])
+        position += HIGHLIGHT_BATCH
+        if position < len(spans):
+            self.root.after(
+                1, self.highlight_batch, text_widget, spans, position, generation
+            )
+        else:
+            self.highlight_pending = False
+            if self.timing_run and not self.processing:
+                # The last of the run's highlighting is done
+                self.timing_run = False
+                self.update_statistics()
+
+    @contextmanager
+    def timed(self, stage):
+        """Add the time the block takes to a GUI stage of the current run
+
+        Only counted while a run is showing its results, so later work such
+        as corrections does not end up in the run's timings.
+        """
+        if not self.timing_run:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ui_timings[stage] += time.perf_counter() - start_time
 
-        # Configure highlighting style
-        text_widget.tag_config(
-            "misspelled", background="#ffcccc", foreground="red", underline=True
-        )
+    def line_offset(self, line):
+        """Character offset at which a 1-based line number starts"""
+        starts = self.document.line_starts
+        if line - 1 < len(starts):
+            return starts[line - 1]
+        return float("inf")
 
     def update_statistics(self):
         """Update the statistics display - NOW INCLUDES EXECUTION TIME"""
         self.stats_text.config(state="normal")
         self.stats_text.delete(1.0, tk.END)
 
+        stage_text = ""
+        if self.last_result is not None:
+            trace = run_trace(self.last_result, self.ui_timings)
+            stages = "\n".join(
+                f"{'UI Update' if stage == 'ui' else stage.title()}: "
+                f"{seconds * 1000:,.0f} ms"
+                for stage, seconds in trace["stages"].items()
+            )
+            stage_text = f"""
+⏱ STAGES (worker time summed)
+{stages}
+Chunks: {len(trace['chunks'])}, avg queue wait {trace['mean_queue_wait'] * 1000:.1f} ms
+Imbalance: {trace['imbalance']:.2f}x (busiest / mean worker)
+"""
+
+        hits, misses = self.stats["cache_hits"], self.stats["cache_misses"]
+        cache_text = "off"
+        if self.engine.cache is not None:
+            cache_text = (
+                f"{hits} hits / {misses} misses ({hits / max(1, hits + misses):.0%})"
+            )
+
         stats_text = f"""📊 STATISTICS
         
 Total Words: {self.stats['total_words']:,}
@@ -482,15 +643,46 @@ Accuracy: {((self.stats['total_words'] - self.stats['misspelled_count']) / max(1
 ⚡ PERFORMANCE
 Processing Time: {self.stats['processing_time']:.2f}s
 Execution Time: {self.stats['execution_time']:.2f}s
-Threads Used: {self.stats['threads_used']}
-"""
-        #  Words/Second: {(self.stats['total_words'] / max(0.001, self.stats['processing_time'])):.0f}
+Words/Second: {(self.stats['total_words'] / max(0.001, self.stats['processing_time'])):,.0f}
+Threads Used: {self.stats['threads_used']} ({self.stats['backend']})
+Suggestion Cache: {self.suggestion_cache.hits} hits / {self.suggestion_cache.misses} misses
+Result Cache: {cache_text}
+{stage_text}"""
 
         self.stats_text.insert(tk.END, stats_text)
-        self.stats_text.config(state="disabled")
+        # Tall enough for every line, the stage timings included
+        height = stats_text.rstrip().count("\n") + 1
+        self.stats_text.config(state="disabled", height=height)
+
+    def dictionary_loaded(self):
+        """The engine's dictionary finished loading, run a check if one waits"""
+        error = self.engine.ready.exception()
+        if error is not None:
+            self.start_pending = False
+            messagebox.showerror("Error", f"Failed to load dictionary: {error}")
+            return
+
+        if self.progress_label.cget("text") == "Loading dictionary...":
+            self.progress_label.config(text="Ready")
+        if self.start_pending:
+            self.start_pending = False
+            self.start_processing()
+
+    def document_busy(self):
+        """Warn and return True if a run or an export still reads the document"""
+        if not (self.processing or self.exports):
+            return False
+        messagebox.showwarning(
+            "Warning", "Please wait for the current run or export to finish!"
+        )
+        return True
 
     def open_file(self):
         """Open and load a text file"""
+        # The old document's memory map is closed once the new one is open
+        if self.document_busy():
+            return
+
         file_path = filedialog.askopenfilename(
             title="Select Text File",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
@@ -500,15 +692,18 @@ Threads Used: {self.stats['threads_used']}
             return
 
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                full_text = file.read()
+            document = Document.open(file_path)
+            if self.document is not None:
+                self.document.close()
+            self.document = document
 
             self.current_file_path = file_path
-            self.original_text = full_text  # Store original text
             self.corrected_words.clear()  # Reset corrections
+            self.journal.clear()
+            self.update_undo_buttons()
+            self.occurrences.clear()
 
-            self.full_text_box.delete(1.0, tk.END)
-            self.full_text_box.insert(tk.END, full_text)
+            self.show_document_text()
 
             # Update window title
             filename = os.path.basename(file_path)
@@ -519,32 +714,134 @@ Threads Used: {self.stats['threads_used']}
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open file: {str(e)}")
 
+    def show_document_text(self, keep_position=False):
+        """Display the document's current text in the text box"""
+        self.view.show(self.document, keep_position)
+
+    def sync_document(self):
+        """Copy edits typed into the text box into the document and re-check them
+
+        Only the edited lines are copied and checked again, and the edit is
+        recorded in the occurrence index instead of moving every span, so a
+        pause in typing costs about as much as what was typed. Counts and
+        highlights are updated in place. Returns True if there were edits
+        to copy.
+        """
+        if self.recheck_job is not None:
+            self.root.after_cancel(self.recheck_job)
+            self.recheck_job = None
+        if self.document is None or self.view.dirty is None:
+            return False  # Nothing typed, so the text need not even be decoded
+        synced = self.view.sync()
+        if synced is None:
+            return False
+
+        edit, removed = synced
+        start, _, replacement = edit
+        # Offsets in the history no longer match the typed-over text
+        self.journal.clear()
+        self.update_undo_buttons()
+
+        # Check the new lines, then swap what was found in the old ones for it
+        result = self.engine.check_region(replacement, start)
+        lost = self.occurrence_index.apply_edit(edit, removed, result["offsets"])
+        self.word_counts.subtract(lost)
+        self.word_counts.update(result["counts"])
+        self.misspelled_words.update(result["misspelled"])
+        changed = set(lost) | set(result["counts"])
+        self.changed_words.update(changed)
+        for word in changed:
+            if self.word_counts[word] <= 0:
+                del self.word_counts[word]
+                self.occurrence_index.discard(word)
+                self.misspelled_words.discard(word)
+        spans = [span for found in result["offsets"].values() for span in found]
+        removed_words = sum(1 for _ in tokenize(removed))
+
+        self.stats["total_words"] += result["words"] - removed_words
+        self.stats["misspelled_count"] = len(self.misspelled_words)
+        self.view.retag(start, start + len(replacement), spans)
+        return True
+
+    def on_text_edit(self):
+        """Schedule a re-check of the typed edits once typing pauses"""
+        if self.recheck_job is not None:
+            self.root.after_cancel(self.recheck_job)
+        self.recheck_job = self.root.after(RECHECK_DELAY, self.recheck_edits)
+
+    def recheck_edits(self):
+        """Re-check the lines typed over since the last check"""
+        self.recheck_job = None
+        if self.processing or not self.engine.ready.done():
+            # A run is using the document or the dictionary is not loaded
+            # yet, try again later
+            self.recheck_job = self.root.after(RECHECK_DELAY, self.recheck_edits)
+            return
+        if self.sync_document():
+            if self.word_counts:
+                self.update_misspelled_words()
+            else:
+                self.show_misspelled_words("✅ No misspelled words found!")
+            self.update_statistics()
+
+    def get_result_cache(self):
+        """The on-disk result cache, opened on first use, or None if unavailable"""
+        if self.result_cache is None:
+            try:
+                self.result_cache = ResultCache()
+            except Exception as e:
+                print(f"Result cache unavailable: {e}")
+                self.cache_var.set(False)
+        return self.result_cache
+
     def start_processing(self):
         """Start the spell checking process"""
-        if not self.current_file_path:
+        if not self.document:
             messagebox.showwarning("Warning", "Please open a file first!")
             return
 
         if self.processing:
             return
 
+        if not self.engine.ready.done():
+            # dictionary_loaded starts the check once the dictionary is in
+            self.start_pending = True
+            self.progress_label.config(text="Loading dictionary...")
+            return
+
         self.processing = True
         self.process_button.config(state="disabled")
         self.cancel_button.config(state="normal")
 
         num_threads = int(self.thread_var.get())
+        self.engine.backend = self.backend_var.get()
+        self.engine.cache = self.get_result_cache() if self.cache_var.get() else None
+        self.sync_document()
+        # Spans stream in for the text as it is now, so no typing until done
+        self.view.set_editable(False)
+        document = self.document
+
+        # Start from a clean slate, partial results stream in from here on
+        self.drain_progress_queue(apply=False)
+        self.last_result = None
+        self.ui_timings = {"highlight": 0.0, "ui": 0.0}
+        self.timing_run = True
+        self.results.clear()
+        self.misspelled_words.clear()
+        self.occurrences.clear()
+        self.word_counts.clear()
+        self.highlight_text(self.full_text_box, self.occurrences)
+        self.show_misspelled_words("Checking...")
 
         # Start processing in a separate thread
         def process_thread():
             try:
                 self.progress_label.config(text="Processing...")
-                misspelled = self.spell_check_parallel(
-                    self.current_file_path, num_threads
-                )
+                result = self.spell_check_parallel(document, num_threads)
 
-                if not self.cancel_event.is_set():
+                if result is not None and not result["cancelled"]:
                     # Update UI in main thread
-                    self.root.after(0, self.processing_complete, misspelled)
+                    self.root.after(0, self.processing_complete, result)
                 else:
                     self.root.after(0, self.processing_cancelled)
 
@@ -563,68 +860,168 @@ Threads Used: {self.stats['threads_used']}
         self.monitor_progress()
 
     def monitor_progress(self):
-        """Monitor progress updates from worker threads"""
+        """Monitor progress updates and partial results from worker threads"""
+        if self.drain_progress_queue():
+            self.update_misspelled_words()
+
+        if self.processing:
+            self.root.after(100, self.monitor_progress)
+
+    def drain_progress_queue(self, apply=True):
+        """Handle all queued messages, returning True if new results arrived"""
+        new_results = False
         try:
             while True:
                 msg_type, value = self.progress_queue.get_nowait()
+                if not apply:
+                    continue
                 if msg_type == "progress":
-                    self.progress_bar["value"] = value
-                    self.progress_label.config(
-                        text=f"Processing... ({value}/{self.progress_bar['maximum']})"
-                    )
+                    # Progress is measured in bytes checked, not chunks finished
+                    completed, total = value
+                    with self.timed("ui"):
+                        self.progress_bar["maximum"] = max(1, total)
+                        self.progress_bar["value"] = completed
+                        self.progress_label.config(
+                            text=f"Processing... {completed / max(1, total):.0%}"
+                        )
+                elif msg_type == "chunk":
+                    self.merge_chunk(value)
+                    new_results = new_results or bool(value["misspelled"])
         except queue.Empty:
             pass
-
-        if self.processing:
-            self.root.after(100, self.monitor_progress)
-
-    def processing_complete(self, misspelled):
+        return new_results
+
+    def merge_chunk(self, chunk):
+        """Fold one finished chunk into the results and highlight its words"""
+        with self.timed("ui"):
+            self.results.append(chunk)
+            self.misspelled_words.update(chunk["misspelled"])
+            self.word_counts.update(chunk["counts"])
+            self.changed_words.update(chunk["counts"])
+            spans = []
+            for word, word_spans in chunk["offsets"].items():
+                self.occurrences.setdefault(word, []).extend(word_spans)
+                spans.extend(word_spans)
+        with self.timed("highlight"):
+            self.view.add_spans(spans)
+
+    def processing_complete(self, result):
         """Handle completion of spell checking"""
         self.processing = False
+        self.view.set_editable(True)
         self.process_button.config(state="normal")
         self.cancel_button.config(state="disabled")
 
-        # Highlight misspelled words
-        self.highlight_text(self.full_text_box, misspelled)
+        # Chunks still queued are highlighted as they are merged
+        self.drain_progress_queue()
+        self.results = result["chunks"]
+        self.last_result = result
 
         # Update results display
-        self.misspelled_text_box.delete(1.0, tk.END)
-        if misspelled:
-            # Sort misspelled words by frequency
-            word_counts = Counter()
-            full_text = self.full_text_box.get(1.0, tk.END)
-            for word in misspelled:
-                word_counts[word] = len(
-                    re.findall(f"\\b{re.escape(word)}\\b", full_text, re.IGNORECASE)
-                )
-
-            sorted_words = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)
-
-            for word, count in sorted_words:
-                self.misspelled_text_box.insert(tk.END, f"{word} ({count})\n")
-        else:
-            self.misspelled_text_box.insert(tk.END, "✅ No misspelled words found!")
+        self.show_misspelled_words("✅ No misspelled words found!")
 
         # Update statistics
         self.update_statistics()
+        self.prewarm_suggestions()
 
         self.progress_label.config(
-            text=f"Complete! Found {len(misspelled)} misspelled words."
+            text=f"Complete! Found {len(result['misspelled'])} misspelled words."
         )
         self.progress_bar["value"] = self.progress_bar["maximum"]
+        self.timing_run = self.highlight_pending
+
+    def update_misspelled_words(self):
+        """Fold changed counts, from merged chunks or typing, into the results list
+
+        A changed count only rewrites its own line, a word no longer
+        misspelled loses its line and new words are appended, so the list
+        keeps its order until it is shown sorted again. Once most listed
+        words change at once, rewriting the whole list is cheaper.
+        """
+        with self.timed("ui"):
+            box = self.misspelled_text_box
+            changed = [word for word in self.changed_words if word in self.listed]
+            new_words = [
+                word
+                for word in self.changed_words
+                if word not in self.listed and word in self.word_counts
+            ]
+            gone = {word for word in changed if word not in self.word_counts}
+            self.changed_words.clear()
+
+            if len(changed) > len(self.listed) // 2:
+                new_words = [
+                    word for word in self.listed if word not in gone
+                ] + new_words
+                self.listed = {}
+            else:
+                # Bottom up, so the lines above keep their numbers
+                line_count = len(self.listed)
+                for line in sorted((self.listed[word] for word in gone), reverse=True):
+                    if line == line_count and line > 1:
+                        box.delete(f"{line - 1}.end", f"{line}.end")
+                    else:
+                        box.delete(f"{line}.0", f"{line + 1}.0")
+                    line_count -= 1
+                if gone:
+                    kept = [word for word in self.listed if word not in gone]
+                    self.listed = {word: line for line, word in enumerate(kept, 1)}
+                for word in changed:
+                    if word in gone:
+                        continue
+                    line = self.listed[word]
+                    box.delete(f"{line}.0", f"{line}.end")
+                    box.insert(f"{line}.0", f"{word} ({self.word_counts[word]})")
+            if not new_words:
+                return
+
+            if self.listed:
+                position, text = "end-1c", "\n"
+            else:
+                box.delete(1.0, tk.END)  # The placeholder or the old list
+                position, text = "1.0", ""
+            for word in new_words:
+                self.listed[word] = len(self.listed) + 1
+            box.insert(
+                position,
+                text
+                + "\n".join(f"{word} ({self.word_counts[word]})" for word in new_words),
+            )
+
+    def show_misspelled_words(self, empty_message):
+        """List the misspelled words with their counts, most frequent first"""
+        with self.timed("ui"):
+            self.listed = {}
+            self.changed_words.clear()
+            self.misspelled_text_box.delete(1.0, tk.END)
+            if not self.word_counts:
+                self.misspelled_text_box.insert(tk.END, empty_message)
+                return
+
+            lines = []
+            for word, count in self.word_counts.most_common():
+                lines.append(f"{word} ({count})")
+                self.listed[word] = len(lines)
+            self.misspelled_text_box.insert(tk.END, "\n".join(lines))
 
     def processing_cancelled(self):
         """Handle cancellation of spell checking"""
         self.processing = False
+        self.view.set_editable(True)
         self.process_button.config(state="normal")
         self.cancel_button.config(state="disabled")
+
+        # Keep whatever was found before the run stopped
+        self.drain_progress_queue()
+        self.stats["misspelled_count"] = len(self.word_counts)
+        self.show_misspelled_words("No misspelled words found before cancelling.")
+        self.update_statistics()
         self.progress_label.config(text="Processing cancelled.")
+        self.timing_run = False
 
     def cancel_processing(self):
         """Cancel the current spell checking operation"""
-        self.cancel_event.set()
-        if self.executor:
-            self.executor.shutdown(wait=False)
+        self.engine.cancel()
 
     def on_word_select(self, event):
         """Handle word selection in misspelled words list - FIXED TO TRACK SELECTED WORD"""
@@ -643,9 +1040,8 @@ Threads Used: {self.stats['threads_used']}
                 self.selected_word_label.config(text=f"Selected: {word}")
 
                 # Get suggestions
-                suggestions = list(self.spell.candidates(word))[
-                    :10
-                ]  # Limit to 10 suggestions
+                suggestions = self.suggestion_cache.get(word, SUGGESTION_COUNT)
+                self.update_statistics()
 
                 # Update suggestions listbox
                 self.suggestions_listbox.delete(0, tk.END)
@@ -655,8 +1051,42 @@ Threads Used: {self.stats['threads_used']}
         except Exception as e:
             print(f"Error getting suggestions: {e}")
 
+    def load_suggestion_index(self):
+        """Load or build the suggestion index without blocking the UI"""
+        try:
+            # Waits for the engine's dictionary, this runs on its own thread
+            spell = self.engine.spell
+            index = SuggestionIndex.load_or_build(spell.word_frequency.dictionary)
+            index.add_words(self.engine.extra_words)
+            self.suggestion_index = index
+            # Anything cached so far came from the unranked fallback
+            self.suggestion_cache.clear()
+        except Exception as e:
+            print(f"Error loading suggestion index: {e}")
+
+    def prewarm_suggestions(self):
+        """Pre-compute suggestions for the most frequent misspelled words"""
+        self.prewarm_stop.set()  # Stop a pre-warm left over from the previous run
+        self.prewarm_stop = threading.Event()
+        words = [word for word, _ in self.word_counts.most_common(PREWARM_WORDS)]
+        threading.Thread(
+            target=self.suggestion_cache.prewarm,
+            args=(words, SUGGESTION_COUNT, self.prewarm_stop),
+            daemon=True,
+        ).start()
+
+    def get_suggestions(self, word, count):
+        """Ranked suggestions for word, best first"""
+        if self.suggestion_index is not None:
+            return self.suggestion_index.lookup(word, count)
+
+        # Index still loading, fall back to the slower unranked candidates
+        return list(self.engine.spell.candidates(word) or [])[:count]
+
     def apply_correction(self, event=None):
         """Apply the selected correction"""
+        if self.processing:
+            return  # Chunks still coming in carry offsets from before the edit
         try:
             selection = self.suggestions_listbox.curselection()
             if not selection or not self.current_selected_word:
@@ -668,43 +1098,11 @@ Threads Used: {self.stats['threads_used']}
             correction = self.suggestions_listbox.get(selection[0])
             original_word = self.current_selected_word
 
-            # Track the correction
-            self.corrected_words[original_word] = correction
-
             # Replace all instances in the text
-            content = self.full_text_box.get(1.0, tk.END)
-            # Use word boundaries for accurate replacement
-            pattern = f"\\b{re.escape(original_word)}\\b"
-            corrected_content = re.sub(
-                pattern, correction, content, flags=re.IGNORECASE
-            )
-
-            self.full_text_box.delete(1.0, tk.END)
-            self.full_text_box.insert(1.0, corrected_content)
-
-            # Remove from misspelled words
-            self.misspelled_words.discard(original_word)
-
-            # Update displays
-            self.highlight_text(self.full_text_box, self.misspelled_words)
+            self.apply_corrections({original_word: correction})
 
             # Refresh misspelled words display
-            self.misspelled_text_box.delete(1.0, tk.END)
-            if self.misspelled_words:
-                word_counts = Counter()
-                full_text = self.full_text_box.get(1.0, tk.END)
-                for word in self.misspelled_words:
-                    word_counts[word] = len(
-                        re.findall(f"\\b{re.escape(word)}\\b", full_text, re.IGNORECASE)
-                    )
-
-                sorted_words = sorted(
-                    word_counts.items(), key=lambda x: x[1], reverse=True
-                )
-                for word, count in sorted_words:
-                    self.misspelled_text_box.insert(tk.END, f"{word} ({count})\n")
-            else:
-                self.misspelled_text_box.insert(tk.END, "✅ All words corrected!")
+            self.show_misspelled_words("✅ All words corrected!")
 
             # Clear selection
             self.current_selected_word = None
@@ -718,8 +1116,165 @@ Threads Used: {self.stats['threads_used']}
         except Exception as e:
             messagebox.showerror("Error", f"Failed to apply correction: {str(e)}")
 
+    def apply_corrections(self, corrections):
+        """Replace every occurrence of the corrected words in a single pass
+
+        corrections maps misspelled words to their replacements. The
+        occurrence index says where each word is, so only those ranges of
+        the document and the text box are rewritten, and the highlights of
+        the remaining words are shifted instead of searched for again.
+        """
+        self.sync_document()
+        edits = correction_edits(self.document.text, corrections, self.occurrences)
+        previous = {word: self.corrected_words.get(word) for word in corrections}
+        self.journal.record(self.document.text, edits, (corrections, previous))
+        self.commit_corrections(edits, corrections)
+        return edits
+
+    def commit_corrections(self, edits, corrections):
+        """Apply correction edits to the document and update the word state"""
+        reloaded = self.view.apply_edits(edits)
+
+        # Track the corrections
+        self.corrected_words.update(corrections)
+        for word in corrections:
+            self.misspelled_words.discard(word)
+            self.occurrences.pop(word, None)
+            self.word_counts.pop(word, None)
+        self.occurrences = {
+            word: shift_spans(spans, edits) for word, spans in self.occurrences.items()
+        }
+
+        # Tags move with the text they are on, unless the text was loaded
+        # again or they were never added
+        if reloaded or self.highlight_pending:
+            self.highlight_text(self.full_text_box, self.occurrences)
+        self.update_undo_buttons()
+
+    def undo_correction(self, event=None):
+        """Take back the last correction, restoring its words and highlights"""
+        if self.processing or not self.journal.undo_entries:
+            return
+        if self.sync_document():
+            return  # Typing over the text cleared the history
+
+        inverse, (corrections, previous) = self.journal.undo()
+        reloaded = self.view.apply_edits(inverse)
+        self.occurrences = {
+            word: shift_spans(spans, inverse)
+            for word, spans in self.occurrences.items()
+        }
+
+        # Every range put back is an occurrence of one of the corrected words
+        restored = []
+        for start, _, original in inverse:
+            word = original.replace("\u2019", "'").lower()
+            span = (start, start + len(original))
+            self.occurrences.setdefault(word, []).append(span)
+            self.word_counts[word] += 1
+            self.misspelled_words.add(word)
+            restored.append(span)
+        for word in corrections:
+            self.occurrences.get(word, []).sort()
+
+        for word, correction in previous.items():
+            if correction is None:
+                self.corrected_words.pop(word, None)
+            else:
+                self.corrected_words[word] = correction
+
+        if reloaded or self.highlight_pending:
+            self.highlight_text(self.full_text_box, self.occurrences)
+        else:
+            self.view.tag_spans(restored)
+        self.show_misspelled_words("✅ All words corrected!")
+        self.update_undo_buttons()
+
+    def redo_correction(self, event=None):
+        """Apply the last undone correction again"""
+        if self.processing or not self.journal.redo_entries:
+            return
+        if self.sync_document():
+            return  # Typing over the text cleared the history
+
+        edits, (corrections, _) = self.journal.redo()
+        self.commit_corrections(edits, corrections)
+        self.show_misspelled_words("✅ All words corrected!")
+
+    def update_undo_buttons(self):
+        """Enable undo and redo only when there is something to take back"""
+        has_undo = "normal" if self.journal.undo_entries else "disabled"
+        has_redo = "normal" if self.journal.redo_entries else "disabled"
+        self.undo_button.config(state=has_undo)
+        self.redo_button.config(state=has_redo)
+
+    def auto_correct(self):
+        """Correct every misspelled word whose best suggestion is confident"""
+        if self.processing:
+            return
+        if not self.misspelled_words:
+            messagebox.showwarning("Warning", "No misspelled words to correct!")
+            return
+        if self.suggestion_index is None:
+            messagebox.showinfo(
+                "Auto-Correct", "Suggestions are still loading, try again shortly."
+            )
+            return
+
+        try:
+            threshold = float(self.confidence_var.get())
+        except ValueError:
+            messagebox.showerror("Error", "Confidence must be a number from 0 to 1.")
+            return
+
+        num_threads = int(self.thread_var.get())
+        self.engine.backend = self.backend_var.get()
+        words = sorted(self.misspelled_words)
+        self.processing = True
+        self.process_button.config(state="disabled")
+        self.auto_correct_button.config(state="disabled")
+        self.progress_label.config(text=f"Auto-correcting {len(words):,} words...")
+
+        # Rate the best suggestion for every word on the worker pool
+        def correct_thread():
+            try:
+                best = self.engine.best_corrections(
+                    words, self.suggestion_index, num_threads
+                )
+                self.root.after(0, self.auto_correct_complete, best, threshold)
+            except Exception as e:
+                message = f"Auto-correct failed: {str(e)}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+                self.root.after(0, self.auto_correct_complete, {}, threshold)
+
+        threading.Thread(target=correct_thread, daemon=True).start()
+
+    def auto_correct_complete(self, best, threshold):
+        """Apply the confident corrections in one pass, leave the rest listed"""
+        self.processing = False
+        self.process_button.config(state="normal")
+        self.auto_correct_button.config(state="normal")
+
+        corrections = {
+            word: suggestion
+            for word, (suggestion, confidence) in best.items()
+            if suggestion
+            and suggestion != word
+            and confidence >= threshold
+            and word in self.misspelled_words
+        }
+        if corrections:
+            self.apply_corrections(corrections)
+        self.show_misspelled_words("✅ All words corrected!")
+        self.progress_label.config(
+            text=f"Auto-corrected {len(corrections):,} words, "
+            f"{len(self.misspelled_words):,} left for review."
+        )
+
     def ignore_word(self):
         """Ignore the selected word - FIXED TO WORK ON SELECTED WORD"""
+        if self.processing:
+            return  # Chunks still coming in would report the word again
         try:
             if not self.current_selected_word:
                 messagebox.showwarning(
@@ -730,37 +1285,21 @@ Threads Used: {self.stats['threads_used']}
             word = self.current_selected_word
 
             # Add to spell checker's known words
-            self.spell.word_frequency.load_words([word])
+            self.engine.add_words([word])
+            if self.suggestion_index is not None:
+                self.suggestion_index.add_words([word])
+            self.suggestion_cache.clear()
 
             # Remove from misspelled words
             self.misspelled_words.discard(word)
+            self.occurrences.pop(word, None)
 
             # Update displays
-            self.highlight_text(self.full_text_box, self.misspelled_words)
+            self.highlight_text(self.full_text_box, self.occurrences)
 
             # Refresh misspelled words display
-            self.misspelled_text_box.delete(1.0, tk.END)
-            if self.misspelled_words:
-                word_counts = Counter()
-                full_text = self.full_text_box.get(1.0, tk.END)
-                for remaining_word in self.misspelled_words:
-                    word_counts[remaining_word] = len(
-                        re.findall(
-                            f"\\b{re.escape(remaining_word)}\\b",
-                            full_text,
-                            re.IGNORECASE,
-                        )
-                    )
-
-                sorted_words = sorted(
-                    word_counts.items(), key=lambda x: x[1], reverse=True
-                )
-                for remaining_word, count in sorted_words:
-                    self.misspelled_text_box.insert(
-                        tk.END, f"{remaining_word} ({count})\n"
-                    )
-            else:
-                self.misspelled_text_box.insert(tk.END, "✅ All words processed!")
+            self.word_counts.pop(word, None)
+            self.show_misspelled_words("✅ All words processed!")
 
             # Clear selection
             self.current_selected_word = None
@@ -776,7 +1315,7 @@ Threads Used: {self.stats['threads_used']}
 
     def download_original(self):
         """Download original text with bold misspelled words"""
-        if not self.original_text:
+        if not self.document or not self.document.size:
             messagebox.showwarning("Warning", "No original text to download!")
             return
 
@@ -789,33 +1328,26 @@ Threads Used: {self.stats['threads_used']}
         if not file_path:
             return
 
-        try:
-            if file_path.endswith(".html"):
-                # Create HTML with bold misspelled words
-                html_content = self.create_html_with_highlights(
-                    self.original_text, self.misspelled_words, "original"
-                )
-                with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(html_content)
-            else:
-                # Create text file with markers
-                marked_content = self.create_marked_text(
-                    self.original_text, self.misspelled_words
-                )
-                with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(marked_content)
-
-            messagebox.showinfo(
-                "Success", "Original file with highlighted errors saved successfully!"
-            )
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save original file: {str(e)}")
+        chunks = document_chunks(self.document, original=True)
+        if file_path.endswith(".html"):
+            # Create HTML with bold misspelled words
+            args = (export_html, file_path, chunks, set(self.misspelled_words))
+        else:
+            # Create text file with markers
+            args = (export_marked_text, file_path, chunks, set(self.misspelled_words))
+        self.export_in_background(
+            *args,
+            "original",
+            success="Original file with highlighted errors saved successfully!",
+            failure="Failed to save original file",
+        )
 
     def download_corrected(self):
         """Download corrected text with bold corrected words"""
-        current_text = self.full_text_box.get(1.0, tk.END).strip()
-        if not current_text:
+        self.sync_document()
+        if self.document is None or not (
+            self.document.text.strip() if self.document.modified else self.document.size
+        ):
             messagebox.showwarning("Warning", "No corrected text to download!")
             return
 
@@ -828,133 +1360,95 @@ Threads Used: {self.stats['threads_used']}
         if not file_path:
             return
 
-        try:
-            if file_path.endswith(".html"):
-                # Create HTML with bold corrected words
-                corrected_words_set = set(self.corrected_words.values())
-                html_content = self.create_html_with_highlights(
-                    current_text, corrected_words_set, "corrected"
-                )
-                with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(html_content)
-            else:
-                # Create text file with markers for corrected words
-                corrected_words_set = set(self.corrected_words.values())
-                marked_content = self.create_marked_text(
-                    current_text, corrected_words_set, marker_type="corrected"
-                )
-                with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(marked_content)
+        # Mark the corrected words
+        chunks = document_chunks(self.document)
+        corrected_words_set = set(self.corrected_words.values())
+        if file_path.endswith(".html"):
+            args = (export_html, file_path, chunks, corrected_words_set)
+        else:
+            args = (export_marked_text, file_path, chunks, corrected_words_set)
+        self.export_in_background(
+            *args,
+            "corrected",
+            success="Corrected file with highlighted corrections saved successfully!",
+            failure="Failed to save corrected file",
+        )
+
+    def export_trace(self):
+        """Save the last run's stage timings and per-chunk records as traces"""
+        if self.last_result is None:
+            messagebox.showwarning("Warning", "No finished run to export!")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            title="Export Run Trace",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json")],
+        )
+        if not file_path:
+            return
 
+        # The Chrome trace goes next to the JSON trace
+        chrome_path = f"{os.path.splitext(file_path)[0]}.chrome.json"
+        try:
+            trace = run_trace(self.last_result, self.ui_timings)
+            write_trace(file_path, trace)
+            write_chrome_trace(chrome_path, trace)
             messagebox.showinfo(
                 "Success",
-                "Corrected file with highlighted corrections saved successfully!",
+                f"Trace saved to {os.path.basename(file_path)}, Chrome trace "
+                f"(chrome://tracing or Perfetto) to {os.path.basename(chrome_path)}.",
             )
-
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to save corrected file: {str(e)}")
-
-    def create_html_with_highlights(self, text, words_to_highlight, doc_type):
-        """Create HTML content with highlighted words"""
-        # Escape HTML characters
-        text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-
-        # Highlight words
-        for word in words_to_highlight:
-            pattern = f"\\b{re.escape(word)}\\b"
-            if doc_type == "original":
-                replacement = f'<strong style="color: red; background-color: #ffcccc;">{word}</strong>'
-            else:  # corrected
-                replacement = f'<strong style="color: green; background-color: #ccffcc;">{word}</strong>'
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-
-        # Convert newlines to HTML breaks
-        text = text.replace("\n", "<br>\n")
-
-        title = (
-            "Original Document with Errors"
-            if doc_type == "original"
-            else "Corrected Document"
-        )
-
-        html_template = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>{title}</title>
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            line-height: 1.6;
-            margin: 20px;
-            background-color: #f9f9f9;
-        }}
-        .container {{
-            background-color: white;
-            padding: 20px;
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .header {{
-            border-bottom: 2px solid #333;
-            padding-bottom: 10px;
-            margin-bottom: 20px;
-        }}
-        .content {{
-            font-size: 14px;
-            line-height: 1.8;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>{title}</h1>
-            <p>Generated on {time.strftime('%Y-%m-%d %H:%M:%S')}</p>
-        </div>
-        <div class="content">
-            {text}
-        </div>
-    </div>
-</body>
-</html>"""
-
-        return html_template
-
-    def create_marked_text(self, text, words_to_highlight, marker_type="original"):
-        """Create text file with marked words"""
-        for word in words_to_highlight:
-            pattern = f"\\b{re.escape(word)}\\b"
-            if marker_type == "original":
-                replacement = f"**{word}**"  # Mark errors with **
-            else:  # corrected
-                replacement = f">>{word}<<"  # Mark corrections with >><<
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-
-        header = f"""
-{'='*50}
-{'ORIGINAL DOCUMENT WITH ERRORS' if marker_type == 'original' else 'CORRECTED DOCUMENT'}
-Generated on {time.strftime('%Y-%m-%d %H:%M:%S')}
-{'**word** = misspelled word' if marker_type == 'original' else '>>word<< = corrected word'}
-{'='*50}
+            messagebox.showerror("Error", f"Failed to export trace: {str(e)}")
 
-"""
+    def export_in_background(self, export, *args, success, failure):
+        """Run a streaming exporter on a worker thread and report when it is done"""
+        self.progress_label.config(text=f"Saving {os.path.basename(args[0])}...")
+        self.exports += 1
+
+        def export_thread():
+            try:
+                export(*args)
+                self.root.after(0, lambda: messagebox.showinfo("Success", success))
+                self.root.after(0, lambda: self.progress_label.config(text="Saved."))
+            except Exception as e:
+                message = f"{failure}: {str(e)}"
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+            finally:
+                self.root.after(0, self.export_finished)
+
+        threading.Thread(target=export_thread, daemon=True).start()
 
-        return header + text
+    def export_finished(self):
+        """An export thread is done with the document"""
+        self.exports -= 1
 
     def clear_all(self):
         """Clear all content and reset the application"""
-        self.full_text_box.delete(1.0, tk.END)
+        if self.document_busy():
+            return  # Closing the document would pull the buffer from under it
+
+        self.view.clear()
         self.misspelled_text_box.delete(1.0, tk.END)
         self.suggestions_listbox.delete(0, tk.END)
         self.stats_text.config(state="normal")
         self.stats_text.delete(1.0, tk.END)
         self.stats_text.config(state="disabled")
 
+        self.prewarm_stop.set()
+        if self.document is not None:
+            self.document.close()
+        self.document = None
         self.current_file_path = None
-        self.original_text = ""
         self.corrected_words.clear()
+        self.journal.clear()
+        self.update_undo_buttons()
         self.misspelled_words.clear()
+        self.occurrences.clear()
+        self.word_counts.clear()
         self.results.clear()
+        self.last_result = None
         self.current_selected_word = None
 
         self.selected_word_label.config(text="Selected: None")
@@ -967,6 +1461,9 @@ def main():
     root = tk.Tk()
     app = SpellCheckerApp(root)
     root.mainloop()
+    app.engine.close()
+    if app.result_cache is not None:
+        app.result_cache.close()
 
 
 if __name__ == "__main__":
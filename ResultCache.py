@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".parallel_spell_checker", "results.db"
+)
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Bumped whenever tokenizing or the stored layout changes, so old entries
+# stop matching instead of being misread
+CACHE_VERSION = 1
+
+# Last-used times of hits are written and committed this many at a time.
+# Every write is committed straight away, so the database is never left
+# locked against other processes sharing it, such as a command line run.
+USED_BATCH = 64
+
+
+class ResultCache:
+    """On-disk cache of per-chunk spell check results
+
+    Entries are keyed by a hash of the chunk's bytes together with a
+    fingerprint of the dictionary and the ignore list, so a chunk is only
+    answered from the cache if checking it again would give the same
+    result. Offsets are stored relative to the chunk. Once the entries take
+    more than max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.used = {}  # {key: last used time} of hits not yet written
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "key BLOB PRIMARY KEY, value BLOB, size INTEGER, used REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_used ON chunks (used)"
+        )
+        (total,) = self.connection.execute("SELECT SUM(size) FROM chunks").fetchone()
+        self.total_bytes = total or 0
+
+    def key(self, data, fingerprint):
+        """Cache key of a chunk's bytes under a dictionary fingerprint"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{CACHE_VERSION}:{fingerprint}:".encode())
+        digest.update(data)
+        return digest.digest()
+
+    def get(self, key):
+        """The result stored under key, or None"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM chunks WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.used[key] = time.time()
+            if len(self.used) >= USED_BATCH:
+                self.write_used()
+
+        result = json.loads(row[0])
+        result["misspelled"] = set(result["misspelled"])
+        result["counts"] = Counter(result["counts"])
+        result["offsets"] = {
+            word: [tuple(span) for span in spans]
+            for word, spans in result["offsets"].items()
+        }
+        return result
+
+    def put(self, key, result):
+        """Store a result with words, misspelled, counts and relative offsets"""
+        value = json.dumps(
+            {
+                "words": result["words"],
+                "misspelled": sorted(result["misspelled"]),
+                "counts": result["counts"],
+                "offsets": result["offsets"],
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        with self.lock:
+            old = self.connection.execute(
+                "SELECT size FROM chunks WHERE key = ?", (key,)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self.connection.commit()
+            self.total_bytes += len(value) - (old[0] if old else 0)
+
+    def write_used(self):
+        """Write the last-used times of recent hits, with the lock held"""
+        used, self.used = self.used, {}
+        self.connection.executemany(
+            "UPDATE chunks SET used = ? WHERE key = ?",
+            [(when, key) for key, when in used.items()],
+        )
+        self.connection.commit()
+
+    def flush(self):
+        """Evict least recently used entries over the size cap and commit"""
+        with self.lock:
+            self.write_used()
+            while self.total_bytes > self.max_bytes:
+                rows = self.connection.execute(
+                    "SELECT key, size FROM chunks ORDER BY used LIMIT 64"
+                ).fetchall()
+                if not rows:
+                    self.total_bytes = 0
+                    break
+                self.connection.executemany(
+                    "DELETE FROM chunks WHERE key = ?", [(key,) for key, _ in rows]
+                )
+                self.total_bytes -= sum(size for _, size in rows)
+            self.connection.commit()
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.used.clear()
+            self.connection.execute("DELETE FROM chunks")
+            self.connection.commit()
+            self.total_bytes = 0
+
+    def close(self):
+        """Commit and close the database"""
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,169 @@
+import json
+import statistics
+import time
+
+# Bumped whenever the layout of a saved trace changes
+TRACE_VERSION = 1
+
+# Stages in pipeline order, with the result timings each one is made of.
+# read covers opening the source and decoding each chunk; tokenize, lookup
+# and count are summed over every worker, so with several workers they can
+# add up to more than the run took. highlight and ui come from the GUI.
+STAGES = (
+    ("read", ("read", "decode")),
+    ("chunk", ("chunk",)),
+    ("tokenize", ("tokenize",)),
+    ("lookup", ("lookup",)),
+    ("count", ("count",)),
+    ("merge", ("merge",)),
+    ("highlight", ("highlight",)),
+    ("ui", ("ui",)),
+)
+
+# Chrome trace events: the engine's own stages go on one thread of pid 0 and
+# chunks answered from the result cache on another
+ENGINE_PID = 0
+ENGINE_TID = 0
+CACHE_TID = 1
+
+
+def stage_times(timings):
+    """{stage: seconds} for every stage in STAGES from a run's timings"""
+    return {
+        stage: sum(timings.get(part, 0.0) for part in parts)
+        for stage, parts in STAGES
+    }
+
+
+def worker_loads(chunks):
+    """{worker: seconds spent on chunks}, leaving out chunks from the cache"""
+    loads = {}
+    for chunk in chunks:
+        if chunk["worker"] != "cache":
+            loads[chunk["worker"]] = loads.get(chunk["worker"], 0.0) + chunk["time"]
+    return loads
+
+
+def imbalance(chunks):
+    """Busiest worker's load over the mean load, 1.0 when perfectly even"""
+    loads = list(worker_loads(chunks).values())
+    if not loads or not sum(loads):
+        return 1.0
+    return max(loads) / statistics.mean(loads)
+
+
+def run_trace(result, ui_timings=None):
+    """Summary and per-chunk records of a run, ready to save as JSON
+
+    ui_timings holds the highlight and ui seconds measured by the GUI.
+    """
+    timings = dict(result["timings"])
+    timings.update(ui_timings or {})
+    chunks = result["chunks"]
+    waits = [chunk["queue_wait"] for chunk in chunks if chunk["worker"] != "cache"]
+    return {
+        "version": TRACE_VERSION,
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "source": result.get("source"),
+        "bytes": result.get("bytes", 0),
+        "backend": result.get("backend"),
+        "workers": result.get("workers"),
+        "total_words": result["total_words"],
+        "words_per_sec": result["total_words"] / max(1e-9, timings.get("total", 0.0)),
+        "timings": timings,
+        "stages": stage_times(timings),
+        "worker_loads": worker_loads(chunks),
+        "imbalance": imbalance(chunks),
+        "mean_queue_wait": statistics.mean(waits) if waits else 0.0,
+        "max_queue_wait": max(waits, default=0.0),
+        "chunks": chunks,
+    }
+
+
+def chrome_trace(trace):
+    """The trace as Chrome trace events, for chrome://tracing or Perfetto
+
+    Each chunk is a slice on the thread that checked it, split into its
+    decode, tokenize, lookup and count time. Those are sums over the
+    chunk's token batches, so they are shown one after another rather than
+    interleaved as they ran.
+    """
+    events = []
+    names = {(ENGINE_PID, ENGINE_TID): "engine", (ENGINE_PID, CACHE_TID): "cache"}
+
+    def microseconds(seconds):
+        return round(seconds * 1e6, 3)
+
+    def add(name, pid, tid, start, duration, args=None):
+        events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "pid": pid,
+                "tid": tid,
+                "ts": microseconds(start),
+                "dur": microseconds(duration),
+                "args": args or {},
+            }
+        )
+
+    # The engine's wall-clock stages, in the order they ran
+    timings = trace["timings"]
+    total = timings.get("total", 0.0)
+    check = timings.get("check", 0.0) + timings.get("chunk", 0.0)
+    add("read", ENGINE_PID, ENGINE_TID, 0.0, timings.get("read", 0.0))
+    add("check", ENGINE_PID, ENGINE_TID, timings.get("read", 0.0), check)
+    add(
+        "merge",
+        ENGINE_PID,
+        ENGINE_TID,
+        total - timings.get("merge", 0.0),
+        timings.get("merge", 0.0),
+    )
+    position = total
+    for stage in ("highlight", "ui"):
+        if timings.get(stage):
+            add(stage, ENGINE_PID, ENGINE_TID, position, timings[stage])
+            position += timings[stage]
+
+    for chunk in trace["chunks"]:
+        if chunk["worker"] == "cache":
+            pid, tid = ENGINE_PID, CACHE_TID
+        else:
+            pid, tid = chunk["pid"], chunk["tid"]
+            names[(pid, tid)] = chunk["worker"]
+        args = {
+            key: chunk[key] for key in ("id", "bytes", "words", "misspelled", "worker")
+        }
+        args["queue_wait_ms"] = chunk["queue_wait"] * 1000
+        add(f"chunk {chunk['id']}", pid, tid, chunk["start"], chunk["time"], args)
+        position = chunk["start"]
+        for stage in ("decode", "tokenize", "lookup", "count"):
+            duration = chunk["timings"].get(stage, 0.0)
+            if duration:
+                add(stage, pid, tid, position, duration)
+                position += duration
+
+    for (pid, tid), name in names.items():
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_trace(path, trace):
+    """Save a run trace as JSON"""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(trace, file, indent=2, ensure_ascii=False)
+
+
+def write_chrome_trace(path, trace):
+    """Save a run trace in the Chrome trace event format"""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(chrome_trace(trace), file, ensure_ascii=False)
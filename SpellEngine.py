@@ -0,0 +1,1538 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import accumulate, islice
+
+from CompactDictionary import CompactDictionary
+from ResultCache import DEFAULT_CACHE_PATH, ResultCache
+from RunTrace import run_trace, write_chrome_trace, write_trace
+from SuggestionIndex import SuggestionIndex, dictionary_fingerprint
+
+# Runs of letters and digits joined by apostrophes, so "don't" is one word while
+# hyphens, underscores and other punctuation separate words
+WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+# Chunks end just after an ASCII whitespace byte, which is never part of a
+# multi-byte UTF-8 sequence, searching at most SNAP_WINDOW bytes ahead
+WHITESPACE_RE = re.compile(rb"\s")
+SNAP_WINDOW = 64 * 1024
+
+# Characters outside the Basic Multilingual Plane, such as emoji, which Tk
+# counts as two columns (UTF-16 code units) in a text index
+ASTRAL_RE = re.compile("[\U00010000-\U0010FFFF]")
+
+BACKENDS = ("thread", "process")
+
+# Once edited, a Document keeps its text in blocks of whole lines of about
+# TEXT_BLOCK characters, so an edit typed into a long text only copies the
+# blocks it touches rather than the whole text and all of its line starts
+TEXT_BLOCK = 16 * 1024
+
+# The byte line index of a Document records the line and character count at
+# the first character boundary of every LINE_INDEX_BLOCK bytes, so any line of
+# a huge file can be found and decoded without decoding everything before it
+LINE_INDEX_BLOCK = 64 * 1024
+
+# Adaptive chunking: each task should take about TARGET_CHUNK_TIME seconds,
+# sized between MIN_CHUNK_SIZE and MAX_CHUNK_SIZE bytes, with QUEUE_DEPTH
+# tasks per worker queued ahead
+TARGET_CHUNK_TIME = 0.05
+INITIAL_CHUNK_SIZE = 256 * 1024
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+QUEUE_DEPTH = 2
+
+# With a result cache, chunks are cut where the content says so instead: after
+# the first line or sentence end at least CACHE_CHUNK_MIN bytes in whose
+# preceding CUT_CONTEXT bytes hash to zero under CUT_MASK, or at
+# CACHE_CHUNK_MAX. Cuts then only depend on nearby text, so an edit leaves the
+# chunks, and cache entries, of the rest of the file as they were
+CUT_RE = re.compile(rb"[.!?]\s|\n")
+NEWLINE_RE = re.compile("\n")
+CACHE_CHUNK_MIN = 64 * 1024
+CACHE_CHUNK_MAX = 1024 * 1024
+CUT_CONTEXT = 32
+CUT_MASK = (1 << 10) - 1
+
+# Workers poll for cancellation every TOKEN_BATCH tokens. The engine notices
+# a cancel within CANCEL_TIMEOUT seconds and then waits at most that long
+# again for running chunks to hand back what they found so far
+TOKEN_BATCH = 4096
+CANCEL_TIMEOUT = 0.05
+
+# A word memo forgets its verdicts once it would hold more than this many, so
+# input full of unique tokens, such as logs, cannot grow it without limit
+MEMO_MAX_WORDS = 200000
+
+# Per-process state of pool workers, filled in by _init_worker
+_worker = {}
+
+# Dictionaries handed to forked workers, keyed by (engine id, dictionary version)
+_inherited_spell = {}
+
+
+def snap_boundary(buffer, position):
+    """Move a byte position forward to just after the next whitespace byte"""
+    size = len(buffer)
+    if position >= size:
+        return size
+
+    match = WHITESPACE_RE.search(buffer, position, position + SNAP_WINDOW)
+    if match:
+        return match.end()
+    if position + SNAP_WINDOW >= size:
+        return size  # The last word runs to the end of the buffer
+
+    # No whitespace nearby, at least avoid cutting a multi-byte character in half
+    return char_boundary(buffer, position)
+
+
+def content_boundary(buffer, low, high):
+    """Content-defined cut between byte positions low and high"""
+    size = len(buffer)
+    if low >= size:
+        return size
+    for match in CUT_RE.finditer(buffer, low, min(high, size)):
+        position = match.end()
+        if zlib.crc32(buffer[position - CUT_CONTEXT : position]) & CUT_MASK == 0:
+            return position
+    return snap_boundary(buffer, high)
+
+
+def char_count(data):
+    """Number of characters a slice of UTF-8 bytes decodes to
+
+    Counted by decoding with errors="replace", as the text and every chunk
+    are, so invalid bytes (e.g. a cp1252 file) count as the U+FFFD they
+    become and offsets stay in step with the decoded text.
+    """
+    if data.isascii():
+        return len(data)
+    return len(str(data, "utf-8", "replace"))
+
+
+def char_boundary(buffer, position):
+    """Move a byte position forward past any UTF-8 continuation bytes
+
+    Decoding with errors="replace" gives the same characters whether or
+    not the bytes are split at such a position.
+    """
+    size = len(buffer)
+    while position < size and 0x80 <= buffer[position] < 0xC0:
+        position += 1
+    return position
+
+
+def tokenize(text, offset=0):
+    """Yield (word, start, end) for every word in text, offsets shifted by offset"""
+    # Curly apostrophes are the same length, so normalizing keeps offsets valid
+    text = text.replace("\u2019", "'")
+    for match in WORD_RE.finditer(text):
+        start, end = match.span()
+        yield match.group(), offset + start, offset + end
+
+
+def find_occurrences(text, words, offset=0):
+    """Map each of words to the (start, end) spans where it occurs in text"""
+    occurrences = {}
+    for word, start, end in tokenize(text, offset):
+        key = word.lower()
+        if key in words:
+            occurrences.setdefault(key, []).append((start, end))
+    return occurrences
+
+
+def match_case(original, replacement):
+    """Give a replacement the capitalization of the word it replaces"""
+    if len(original) > 1 and original.isupper():
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+def correction_edits(text, corrections, occurrences=None):
+    """Sorted (start, end, replacement) edits for every corrected word in text
+
+    corrections maps lowercase words to their replacements. The spans come
+    from the occurrence index when one is given, otherwise from a single
+    tokenizing pass that matches all of the corrected words at once.
+    """
+    if occurrences is None:
+        occurrences = find_occurrences(text, corrections)
+    edits = [
+        (start, end, match_case(text[start:end], replacement))
+        for word, replacement in corrections.items()
+        for start, end in occurrences.get(word, ())
+    ]
+    edits.sort()
+    return edits
+
+
+def apply_edits(text, edits):
+    """Apply sorted, non-overlapping (start, end, replacement) edits in one pass"""
+    parts = []
+    position = 0
+    for start, end, replacement in edits:
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def inverse_edits(edits, removed):
+    """Edits that undo edits, given the text each of them replaced"""
+    inverse = []
+    shift = 0
+    for (start, end, replacement), original in zip(edits, removed):
+        inverse.append((start + shift, start + shift + len(replacement), original))
+        shift += len(replacement) - (end - start)
+    return inverse
+
+
+def shift_offsets(offsets, edits):
+    """Move offsets outside the edited ranges to where they are after edits"""
+    ends = [end for _, end, _ in edits]
+    shifts = [0, *accumulate(len(new) - (end - start) for start, end, new in edits)]
+    return [offset + shifts[bisect_right(ends, offset)] for offset in offsets]
+
+
+def shift_line_starts(starts, edits):
+    """Line starts of a text after edits, from its line starts before them"""
+    result = []
+    shift = 0
+    position = 0
+    for start, end, replacement in edits:
+        # Lines starting after a newline inside the replaced text are gone,
+        # and every newline in the replacement starts a new one
+        kept = bisect_right(starts, start, position)
+        result.extend(offset + shift for offset in starts[position:kept])
+        position = bisect_right(starts, end, kept)
+        base = start + shift
+        result.extend(base + match.end() for match in NEWLINE_RE.finditer(replacement))
+        shift += len(replacement) - (end - start)
+    result.extend(offset + shift for offset in starts[position:])
+    return result
+
+
+def shift_spans(spans, edits):
+    """Move (start, end) spans of untouched words to where they are after edits"""
+    starts = shift_offsets([start for start, _ in spans], edits)
+    ends = shift_offsets([end for _, end in spans], edits)
+    return list(zip(starts, ends))
+
+
+def line_starts(text):
+    """Character offsets at which each line of text starts"""
+    return [0, *accumulate(len(line) + 1 for line in text.split("\n"))][:-1]
+
+
+def text_index(starts, offset, text=None):
+    """Convert a character offset into a Tk "line.column" text index
+
+    Pass the text if it may hold characters outside the Basic Multilingual
+    Plane, so the column counts each of them as two like Tk does.
+    """
+    line = bisect_right(starts, offset) - 1
+    column = offset - starts[line]
+    if text is not None:
+        column += len(ASTRAL_RE.findall(text[starts[line] : offset]))
+    return f"{line + 1}.{column}"
+
+
+def split_blocks(text, starts):
+    """Cut text into blocks of whole lines, given its line starts
+
+    Returns the blocks and, for each, the line starts relative to it.
+    """
+    blocks = []
+    block_starts = []
+    line = 0
+    while line < len(starts):
+        start = starts[line]
+        next_line = bisect_left(starts, start + TEXT_BLOCK, line + 1)
+        end = starts[next_line] if next_line < len(starts) else len(text)
+        blocks.append(text[start:end])
+        block_starts.append([offset - start for offset in starts[line:next_line]])
+        line = next_line
+    return blocks, block_starts
+
+
+class TextBlocks:
+    """Text kept as blocks of whole lines, so a small edit copies one block
+
+    Applying an edit to a single string copies all of it and shifts every
+    line start after the edit. Here only the blocks an edit touches are
+    rebuilt, plus the running offsets of the blocks. Slices and line starts
+    are read from the blocks; str() joins the whole text.
+    """
+
+    def __init__(self, text, starts=None):
+        if starts is None:
+            starts = line_starts(text)
+        self.blocks, self.block_starts = split_blocks(text, starts)
+        self.line_starts = BlockLineStarts(self)
+        self.update_offsets()
+
+    def update_offsets(self):
+        """Recount the character offset and first line of every block"""
+        self.offsets = [0, *accumulate(len(block) for block in self.blocks)]
+        self.first_lines = [0, *accumulate(map(len, self.block_starts))]
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __str__(self):
+        return "".join(self.blocks)
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(len(self))
+        if start >= stop:
+            return ""
+        first = self.block_at(start)
+        last = self.block_at(stop - 1)
+        text = "".join(self.blocks[first : last + 1])
+        base = self.offsets[first]
+        return text[start - base : stop - base]
+
+    def block_at(self, offset):
+        """Index of the block holding a character offset"""
+        return min(bisect_right(self.offsets, offset), len(self.blocks)) - 1
+
+    def apply(self, edits):
+        """Apply sorted, non-overlapping (start, end, replacement) edits"""
+        blocks = []
+        block_starts = []
+        copied = 0
+        position = 0
+        while position < len(edits):
+            first = self.block_at(edits[position][0])
+            last = max(first, self.block_at(edits[position][1]))
+            following = position + 1
+            while True:
+                # Take in every edit that starts within the blocks taken
+                while (
+                    following < len(edits)
+                    and self.block_at(edits[following][0]) <= last
+                ):
+                    last = max(last, self.block_at(edits[following][1]))
+                    following += 1
+                base = self.offsets[first]
+                relative = [
+                    (start - base, end - base, replacement)
+                    for start, end, replacement in edits[position:following]
+                ]
+                text = apply_edits("".join(self.blocks[first : last + 1]), relative)
+                # The next block has to start a line, or it joins these
+                final = last == len(self.blocks) - 1
+                if final or not text or text.endswith("\n"):
+                    break
+                last += 1
+
+            starts = [
+                self.offsets[block] - base + start
+                for block in range(first, last + 1)
+                for start in self.block_starts[block]
+            ]
+            starts = shift_line_starts(starts, relative)
+            if not final and starts and starts[-1] == len(text):
+                starts.pop()  # The line after the text is the next block's
+            new_blocks, new_starts = split_blocks(text, starts)
+            blocks += self.blocks[copied:first] + new_blocks
+            block_starts += self.block_starts[copied:first] + new_starts
+            copied = last + 1
+            position = following
+
+        self.blocks = blocks + self.blocks[copied:]
+        self.block_starts = block_starts + self.block_starts[copied:]
+        self.update_offsets()
+
+
+class BlockLineStarts:
+    """The line starts of a TextBlocks, as a sequence of character offsets"""
+
+    def __init__(self, text):
+        self.text = text
+
+    def __len__(self):
+        return self.text.first_lines[-1]
+
+    def __getitem__(self, line):
+        text = self.text
+        if line < 0:
+            line += len(self)
+        if not 0 <= line < len(self):
+            raise IndexError("line out of range")
+        block = bisect_right(text.first_lines, line) - 1
+        first_line = text.first_lines[block]
+        return text.offsets[block] + text.block_starts[block][line - first_line]
+
+
+class Document:
+    """One loaded text: the raw buffer, its decoded text and line offsets
+
+    Opening, checking, statistics and export all read from the same object,
+    so a file is read and decoded once. The buffer holds the bytes as they
+    are on disk (memory-mapped for files), text holds the current contents
+    and is decoded on first use, and apply_edits changes it, for corrections
+    and typing alike. Once edited, the contents are kept as TextBlocks and
+    text is only joined again when it is asked for.
+    """
+
+    def __init__(self, buffer, name, path=None, file=None):
+        self.buffer = buffer
+        self.name = name
+        self.path = path
+        self.file = file
+        self.modified = False  # True once text no longer matches the buffer
+        self._text = None
+        self._blocks = None  # TextBlocks of the contents once edited
+        self._line_starts = None
+        self._astral = None
+        self._block_starts = None
+        self._block_lines = None
+        self._block_chars = None
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a file"""
+        path = os.fspath(path)
+        file = open(path, "rb")
+        try:
+            if os.fstat(file.fileno()).st_size == 0:
+                buffer = b""
+            else:
+                buffer = mmap.mmap(file.fileno(), length=0, access=mmap.ACCESS_READ)
+        except Exception:
+            file.close()
+            raise
+        return cls(buffer, path, path, file)
+
+    @classmethod
+    def from_bytes(cls, data, name="<bytes>"):
+        """Wrap in-memory UTF-8 data"""
+        return cls(bytes(data), name)
+
+    @classmethod
+    def from_stream(cls, stream):
+        """Read a binary or text stream"""
+        data = stream.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return cls(data, getattr(stream, "name", "<stream>"))
+
+    @property
+    def size(self):
+        return len(self.buffer)
+
+    @property
+    def text(self):
+        if self._text is None:
+            if self._blocks is not None:
+                self._text = str(self._blocks)
+            else:
+                # Decode straight from the buffer, without a bytes copy
+                self._text = str(memoryview(self.buffer), "utf-8", "replace")
+        return self._text
+
+    @property
+    def chars(self):
+        """The current contents for slicing, without joining edited blocks"""
+        return self._blocks if self._blocks is not None else self.text
+
+    @property
+    def length(self):
+        """Number of characters in the current text"""
+        return len(self.chars)
+
+    def apply_edits(self, edits):
+        """Apply sorted (start, end, replacement) edits to the current text
+
+        Only the blocks of lines the edits touch are rebuilt, together with
+        their line starts.
+        """
+        if self._blocks is None:
+            self._blocks = TextBlocks(self.text, self._line_starts)
+            self._line_starts = None
+        self._blocks.apply(edits)
+        self._text = None
+        self.modified = True
+        if self._astral is False:
+            self._astral = any(ASTRAL_RE.search(new) for _, _, new in edits)
+
+    @property
+    def line_starts(self):
+        """Character offset at which each line of text starts"""
+        if self._blocks is not None:
+            return self._blocks.line_starts
+        if self._line_starts is None:
+            self._line_starts = line_starts(self.text)
+        return self._line_starts
+
+    @property
+    def astral(self):
+        """Whether text holds characters Tk counts as two columns"""
+        if self._astral is None:
+            self._astral = ASTRAL_RE.search(self.text) is not None
+        return self._astral
+
+    def build_line_index(self):
+        """Count lines and characters per block of the buffer, without decoding"""
+        if self._block_lines is not None:
+            return
+        block_starts = array("Q", [0])
+        block_lines = array("Q", [0])
+        block_chars = array("Q", [0])
+        start = 0
+        while start < self.size:
+            end = char_boundary(self.buffer, start + LINE_INDEX_BLOCK)
+            data = self.buffer[start:end]
+            block_starts.append(end)
+            block_lines.append(block_lines[-1] + data.count(b"\n"))
+            block_chars.append(block_chars[-1] + char_count(data))
+            start = end
+        self._block_starts = block_starts
+        self._block_lines = block_lines
+        self._block_chars = block_chars
+
+    @property
+    def line_count(self):
+        """Number of lines in the current text"""
+        if self.modified:
+            return len(self.line_starts)
+        self.build_line_index()
+        return self._block_lines[-1] + 1
+
+    def line_position(self, line):
+        """Byte offset in the buffer at which a 0-based line starts"""
+        self.build_line_index()
+        if line <= 0:
+            return 0
+        if line > self._block_lines[-1]:
+            return self.size
+
+        # The block holding the newline that ends the previous line
+        block = bisect_left(self._block_lines, line) - 1
+        position = self._block_starts[block]
+        for _ in range(line - self._block_lines[block]):
+            position = self.buffer.find(b"\n", position) + 1
+        return position
+
+    def char_offset(self, position):
+        """Character offset into text of a byte offset into the buffer"""
+        self.build_line_index()
+        block = bisect_right(self._block_starts, position) - 1
+        block_start = self._block_starts[block]
+        return self._block_chars[block] + char_count(
+            self.buffer[block_start:position]
+        )
+
+    def lines(self, first, last):
+        """Text of lines first to last (0-based, exclusive) and its char offset
+
+        Only those lines are decoded, so a window of a huge memory-mapped
+        file can be shown without reading the rest of it.
+        """
+        if self.modified:
+            starts = self.line_starts
+            start = starts[first] if first < len(starts) else self.length
+            end = starts[last] if last < len(starts) else self.length
+            return self.chars[start:end], start
+
+        start = self.line_position(first)
+        end = self.line_position(last)
+        text = str(memoryview(self.buffer)[start:end], "utf-8", "replace")
+        return text, self.char_offset(start)
+
+    def close(self):
+        """Release the memory map and the file"""
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class EditJournal:
+    """Undo/redo history of edits, kept as the changed ranges only
+
+    Each entry holds the (start, end, replacement) edits, the text they
+    replaced and whatever state the caller needs to restore, so memory
+    grows with the size of the edits rather than with the document.
+    """
+
+    def __init__(self):
+        self.undo_entries = []
+        self.redo_entries = []
+
+    def record(self, text, edits, state=None):
+        """Remember edits that are about to be applied to text"""
+        removed = [text[start:end] for start, end, _ in edits]
+        self.undo_entries.append((edits, removed, state))
+        self.redo_entries.clear()
+
+    def undo(self):
+        """Take back the last entry, returning (inverse edits, state)"""
+        edits, removed, state = entry = self.undo_entries.pop()
+        self.redo_entries.append(entry)
+        return inverse_edits(edits, removed), state
+
+    def redo(self):
+        """Apply the last undone entry again, returning (edits, state)"""
+        edits, _, state = entry = self.redo_entries.pop()
+        self.undo_entries.append(entry)
+        return edits, state
+
+    def clear(self):
+        """Forget all history, e.g. after the text changed some other way"""
+        self.undo_entries.clear()
+        self.redo_entries.clear()
+
+
+class OccurrenceIndex:
+    """Spans of misspelled words, kept in step with typed edits lazily
+
+    Moving every span past each edit typed into a long text costs time in
+    proportion to all of them. Instead an edit is recorded as a range of
+    edited text, merged with the ranges recorded before it, and the spans
+    found in its replacement are kept apart. current() moves the rest past
+    all of the ranges in one pass, once every span is needed again.
+    """
+
+    def __init__(self, occurrences=None):
+        # {word: [(start, end), ...]} in offsets from before the recorded edits
+        self.occurrences = {} if occurrences is None else occurrences
+        # Sorted, disjoint (start, end, new_start, new_end) ranges of edited
+        # text, in those offsets and in offsets of the current text
+        self.edited = []
+        self.fresh = {}  # Spans found in edited text, in current offsets
+
+    def current(self):
+        """{word: sorted spans} in offsets of the current text"""
+        if not self.edited and not self.fresh:
+            return self.occurrences
+
+        starts = [start for start, _, _, _ in self.edited]
+        ends = [end for _, end, _, _ in self.edited]
+        shifts = [0] + [new_end - end for _, end, _, new_end in self.edited]
+        occurrences = {}
+        for word, spans in self.occurrences.items():
+            moved = []
+            for start, end in spans:
+                edited = bisect_right(ends, start)
+                if edited < len(starts) and starts[edited] < end:
+                    continue  # Typed over
+                shift = shifts[edited]
+                moved.append((start + shift, end + shift))
+            if moved:
+                occurrences[word] = moved
+        for word, spans in self.fresh.items():
+            if spans:
+                merged = occurrences.setdefault(word, [])
+                merged.extend(spans)
+                merged.sort()
+
+        self.occurrences = occurrences
+        self.edited = []
+        self.fresh = {}
+        return occurrences
+
+    def recorded_span(self, start, end):
+        """Offsets among the recorded spans of a span of the current text
+
+        None if the span is in text typed since they were recorded.
+        """
+        edited = bisect_right([new_end for _, _, _, new_end in self.edited], start)
+        if edited < len(self.edited) and self.edited[edited][2] < end:
+            return None
+        if edited == 0:
+            return start, end
+        _, old_end, _, new_end = self.edited[edited - 1]
+        return start - (new_end - old_end), end - (new_end - old_end)
+
+    def apply_edit(self, edit, removed, found):
+        """Record a (start, end, replacement) edit typed over the text
+
+        removed is the text the edit replaced and found maps words to their
+        spans in the replacement. Returns a Counter of the occurrences the
+        edit took away, per word.
+        """
+        start, end, replacement = edit
+        shift = len(replacement) - (end - start)
+        lost = Counter()
+
+        for word, spans in self.fresh.items():
+            kept = []
+            for span in spans:
+                if span[1] <= start:
+                    kept.append(span)
+                elif span[0] >= end:
+                    kept.append((span[0] + shift, span[1] + shift))
+                else:
+                    lost[word] += 1
+            self.fresh[word] = kept
+
+        # Recorded spans are exactly the words of the removed text that
+        # match one, since spans always cover a whole token
+        for word, word_start, word_end in tokenize(removed, start):
+            word = word.lower()
+            spans = self.occurrences.get(word)
+            span = spans and self.recorded_span(word_start, word_end)
+            if span:
+                spans.sort()  # Chunks may have been merged out of order
+                position = bisect_left(spans, span)
+                if position < len(spans) and spans[position] == span:
+                    lost[word] += 1
+
+        # Merge the edited range with the ranges it overlaps or touches
+        edited = self.edited
+        first = bisect_left([new_end for _, _, _, new_end in edited], start)
+        last = first
+        while last < len(edited) and edited[last][2] <= end:
+            last += 1
+        before = edited[first - 1][3] - edited[first - 1][1] if first else 0
+        old_start, old_end = start - before, end - before
+        new_start, new_end = start, end
+        if first < last:
+            after = edited[last - 1][3] - edited[last - 1][1]
+            old_start = min(edited[first][0], old_start)
+            old_end = max(edited[last - 1][1], end - after)
+            new_start = min(edited[first][2], start)
+            new_end = max(edited[last - 1][3], end)
+        self.edited = (
+            edited[:first]
+            + [(old_start, old_end, new_start, new_end + shift)]
+            + [
+                (old_a, old_b, new_a + shift, new_b + shift)
+                for old_a, old_b, new_a, new_b in edited[last:]
+            ]
+        )
+
+        for word, spans in found.items():
+            self.fresh.setdefault(word, []).extend(spans)
+        return lost
+
+    def discard(self, word):
+        """Forget a word, e.g. once none of its occurrences are left"""
+        self.occurrences.pop(word, None)
+        self.fresh.pop(word, None)
+
+
+class WordMemo:
+    """Known/unknown verdicts for distinct lowercase words
+
+    Shared by every chunk and run that uses the same dictionary, so each
+    distinct word goes through the dictionary's unknown only once. Worker
+    processes keep their own memo and report what they learned, which the
+    engine merges back into its memo. Once it would hold more than
+    max_words verdicts it starts over, which costs one more lookup per
+    word at most.
+    """
+
+    def __init__(self, verdicts=None, track_learned=False, max_words=MEMO_MAX_WORDS):
+        self.verdicts = dict(verdicts or {})  # {word: True if misspelled}
+        self.track_learned = track_learned
+        self.max_words = max_words
+        self.learned = {}  # Verdicts added since the last take_learned()
+        self.lock = threading.Lock()
+
+    def unknown(self, spell, words):
+        """Misspelled subset of a set of distinct lowercase words"""
+        new_words = []
+        misspelled = set()
+        with self.lock:
+            verdicts = self.verdicts
+            for word in words:
+                verdict = verdicts.get(word)
+                if verdict is None:
+                    new_words.append(word)
+                elif verdict:
+                    misspelled.add(word)
+
+        if new_words:
+            unknown = spell.unknown(new_words)
+            learned = {word: word in unknown for word in new_words}
+            self.merge(learned)
+            misspelled.update(word for word, verdict in learned.items() if verdict)
+        return misspelled, len(new_words)
+
+    def merge(self, verdicts):
+        """Add verdicts learned elsewhere, such as in a worker process"""
+        with self.lock:
+            if len(self.verdicts) + len(verdicts) > self.max_words:
+                self.verdicts.clear()
+            self.verdicts.update(verdicts)
+            if self.track_learned:
+                self.learned.update(verdicts)
+
+    def take_learned(self):
+        """Return and forget the verdicts added since the last call"""
+        with self.lock:
+            learned, self.learned = self.learned, {}
+        return learned
+
+    def add_known(self, words):
+        """Mark words as correctly spelled after they were added to the dictionary"""
+        with self.lock:
+            for word in words:
+                self.verdicts[word.lower()] = False
+
+
+def check_text(spell, text, offset, memo=None, cancel_event=None):
+    """Check decoded text and return its word count and misspelled words
+
+    The result holds the misspelled words with a Counter of how often each
+    occurs and the (start, end) offsets of every occurrence. Each distinct
+    word is looked up once, and not at all if the memo already knows it.
+    Tokens are checked TOKEN_BATCH at a time and cancel_event is polled
+    between batches; a cancelled check returns what it found so far. The
+    time spent tokenizing, looking words up and counting misspellings is
+    summed over the batches into the result's timings.
+    """
+    tokens = tokenize(text, offset)
+    words = 0
+    lookups = 0
+    misspelled = set()
+    counts = Counter()
+    offsets = {}
+    cancelled = False
+    timings = {"tokenize": 0.0, "lookup": 0.0, "count": 0.0}
+    while True:
+        stage_start = time.perf_counter()
+        batch = [
+            (word.lower(), start, end)
+            for word, start, end in islice(tokens, TOKEN_BATCH)
+        ]
+        if not batch:
+            timings["tokenize"] += time.perf_counter() - stage_start
+            break
+        if cancel_event is not None and cancel_event.is_set():
+            cancelled = True
+            break
+
+        distinct = {word for word, _, _ in batch}
+        lookup_start = time.perf_counter()
+        timings["tokenize"] += lookup_start - stage_start
+        if memo is not None:
+            unknown, batch_lookups = memo.unknown(spell, distinct)
+        else:
+            unknown, batch_lookups = spell.unknown(distinct), len(distinct)
+        count_start = time.perf_counter()
+        timings["lookup"] += count_start - lookup_start
+        words += len(batch)
+        lookups += batch_lookups
+        misspelled |= unknown
+        for word, start, end in batch:
+            if word in unknown:
+                counts[word] += 1
+                offsets.setdefault(word, []).append((start, end))
+        timings["count"] += time.perf_counter() - count_start
+
+    return {
+        "words": words,
+        "lookups": lookups,
+        "misspelled": misspelled,
+        "counts": counts,
+        "offsets": offsets,
+        "cancelled": cancelled,
+        "timings": timings,
+    }
+
+
+def record_run(result, start_time, decoded):
+    """Add when, where and how long a chunk ran to its result
+
+    Times are perf_counter readings, which use a system-wide clock, so the
+    engine can compare them with its own even for process workers.
+    """
+    finished = time.perf_counter()
+    result["timings"]["decode"] = decoded - start_time
+    result.update(
+        started=start_time,
+        finished=finished,
+        time=finished - start_time,
+        pid=os.getpid(),
+        tid=threading.get_native_id(),
+        worker=f"{os.getpid()}/{threading.current_thread().name}",
+    )
+    return result
+
+
+class RunCancelEvent:
+    """Cancel flag of one run as seen from a worker process
+
+    The engine shares a counter with its workers that holds the id of the
+    run in progress, or 0. A run counts as cancelled once the counter moves
+    on, whether cancel() reset it or a newer run took over, so tasks left
+    over from an abandoned run never resume.
+    """
+
+    def __init__(self, active_run, run_id):
+        self.active_run = active_run
+        self.run_id = run_id
+
+    def is_set(self):
+        return self.active_run.value != self.run_id
+
+
+def _init_worker(
+    key, dictionary_path, prefilter, language, extra_words, verdicts, active_run
+):
+    """Load the dictionary and the engine's word memo once per worker process"""
+    spell = _inherited_spell.get(key)
+    if spell is None:
+        if dictionary_path is not None:
+            # Mapped, so every worker shares the same pages of the dictionary
+            spell = CompactDictionary.load(dictionary_path, prefilter)
+        else:
+            from spellchecker import SpellChecker
+
+            spell = SpellChecker(language=language)
+        spell.word_frequency.load_words(extra_words)
+    _worker["spell"] = spell
+    _worker["memo"] = WordMemo(verdicts, track_learned=True)
+    _worker["active_run"] = active_run
+    _worker["extra_words"] = extra_words
+
+
+def _check_range(path, start, end, offset, chunk_id, run_id):
+    """Check a byte range of a file inside a pool worker for run run_id"""
+    start_time = time.perf_counter()
+    cancel_event = RunCancelEvent(_worker["active_run"], run_id)
+    if cancel_event.is_set():
+        result = check_text(None, "", offset)
+        result.update(id=chunk_id, learned={}, cancelled=True)
+        return record_run(result, start_time, start_time)
+
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), length=0, access=mmap.ACCESS_READ) as m:
+            text = m[start:end].decode("utf-8", errors="replace")
+    decoded = time.perf_counter()
+
+    memo = _worker["memo"]
+    result = check_text(_worker["spell"], text, offset, memo, cancel_event)
+    # Send back only what this chunk learned so the engine can merge it
+    result.update(id=chunk_id, learned=memo.take_learned())
+    return record_run(result, start_time, decoded)
+
+
+def _best_corrections(index_path, words):
+    """Rate the best suggestion for each of words inside a pool worker"""
+    if _worker.get("index_path") != index_path:
+        # Mapped once per worker, the pages are shared with every other process
+        index = SuggestionIndex.load(index_path)
+        index.add_words(_worker["extra_words"])
+        _worker["index"] = index
+        _worker["index_path"] = index_path
+    index = _worker["index"]
+    return {word: index.correction(word) for word in words}
+
+
+def relative_result(chunk_result, offset):
+    """A chunk result with its offsets made relative to the chunk, for caching"""
+    return {
+        "words": chunk_result["words"],
+        "misspelled": chunk_result["misspelled"],
+        "counts": chunk_result["counts"],
+        "offsets": {
+            word: [(start - offset, end - offset) for start, end in spans]
+            for word, spans in chunk_result["offsets"].items()
+        },
+    }
+
+
+def cached_result(cached, offset, chunk_id):
+    """Turn a cached chunk result back into one at the chunk's offset"""
+    cached["offsets"] = {
+        word: [(start + offset, end + offset) for start, end in spans]
+        for word, spans in cached["offsets"].items()
+    }
+    cached.update(id=chunk_id, lookups=0, time=0.0, cancelled=False, cached=True)
+    cached["timings"] = {}
+    return cached
+
+
+class ChunkScheduler:
+    """Cuts a buffer into tasks on demand, sized from the measured throughput
+
+    Tasks are cut in order, so each one's character offset follows from the
+    previous ones. The first tasks use a size that gives every worker a few
+    of them even on small inputs. After that each cut aims at
+    TARGET_CHUNK_TIME seconds of work, based on a moving average of the
+    bytes per second the workers have reported. With content_defined set,
+    cuts come from content_boundary so they can be matched against cached
+    results, whatever the throughput.
+    """
+
+    def __init__(self, buffer, num_workers, chunk_size=None, content_defined=False):
+        self.buffer = buffer
+        self.size = len(buffer)
+        self.content_defined = content_defined
+        self.fixed_size = chunk_size
+        self.chunk_size = chunk_size or max(
+            MIN_CHUNK_SIZE,
+            min(INITIAL_CHUNK_SIZE, self.size // (num_workers * QUEUE_DEPTH * 2)),
+        )
+        self.throughput = None  # Bytes per second, moving average
+        self.position = 0
+        self.offset = 0
+        self.next_id = 0
+        self.elapsed = 0.0  # Time spent cutting, reported as the chunk stage
+
+    def next_chunk(self):
+        """Return the next (start, end, offset, chunk_id), or None when done"""
+        if self.position >= self.size:
+            return None
+
+        start_time = time.perf_counter()
+        start = self.position
+        if self.content_defined:
+            end = content_boundary(
+                self.buffer, start + CACHE_CHUNK_MIN, start + CACHE_CHUNK_MAX
+            )
+        else:
+            end = snap_boundary(self.buffer, start + self.chunk_size)
+        chunk = (start, end, self.offset, self.next_id)
+
+        self.offset += char_count(self.buffer[start:end])
+        self.position = end
+        self.next_id += 1
+        self.elapsed += time.perf_counter() - start_time
+        return chunk
+
+    def record(self, nbytes, seconds):
+        """Update the throughput estimate from a finished task"""
+        if self.fixed_size or self.content_defined or seconds <= 0:
+            return
+
+        rate = nbytes / seconds
+        if self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput = 0.7 * self.throughput + 0.3 * rate
+        target = int(self.throughput * TARGET_CHUNK_TIME)
+        self.chunk_size = min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, target))
+
+
+class SpellEngine:
+    """Headless spell checking pipeline shared by the GUI and the command line"""
+
+    def __init__(
+        self,
+        spell=None,
+        num_workers=4,
+        backend="thread",
+        language="en",
+        chunk_size=None,
+        cache=None,
+        prefilter=False,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        self.ready = Future()  # Resolves to the dictionary once it is loaded
+        if spell is not None:
+            self.ready.set_result(spell)
+        else:
+            # Mapped from disk rather than parsed, on a background thread so
+            # the caller can get on with other work in the meantime
+            threading.Thread(
+                target=self.load_dictionary, args=(language, prefilter), daemon=True
+            ).start()
+        self.language = language
+        self.num_workers = num_workers
+        self.backend = backend
+        self.chunk_size = chunk_size  # Fixed chunk size in bytes, None to adapt
+        self.cache = cache  # ResultCache of per-chunk results, or None
+        # Each run gets its own cancel event, so threads still finishing a
+        # cancelled run are not revived by the next one. Process workers
+        # cannot see it and compare the run id with active_run instead, a
+        # shared counter made with the first pool so that multiprocessing
+        # is only imported when used
+        self.cancel_event = threading.Event()
+        self.run_id = 0
+        self.active_run = None
+        self.futures = {}
+
+        # Words added at runtime, replayed into process workers
+        self.extra_words = set()
+        self.dictionary_version = 0
+        self.memo = WordMemo()
+        self.fingerprint = None  # (dictionary version, fingerprint)
+
+        self.pool = None
+        self.pool_key = None
+
+    def load_dictionary(self, language, prefilter=False):
+        """Load the compact dictionary of language and resolve ready with it"""
+        try:
+            dictionary = CompactDictionary.load_or_build(language, prefilter=prefilter)
+            self.ready.set_result(dictionary)
+        except Exception as e:
+            self.ready.set_exception(e)
+
+    @property
+    def spell(self):
+        """The dictionary, waiting for it if it is still loading"""
+        return self.ready.result()
+
+    def add_words(self, words):
+        """Add words to the dictionary so they are no longer reported"""
+        words = list(words)
+        self.spell.word_frequency.load_words(words)
+        self.extra_words.update(words)
+        self.memo.add_known(words)
+        self.dictionary_version += 1
+
+    def dictionary_fingerprint(self):
+        """Identifies the dictionary and ignore list, for the result cache"""
+        if self.fingerprint is None or self.fingerprint[0] != self.dictionary_version:
+            digest = hashlib.blake2b(digest_size=16)
+            frequencies = self.spell.word_frequency.dictionary
+            digest.update(
+                f"{self.language}:{dictionary_fingerprint(frequencies)}".encode()
+            )
+            for word in sorted(self.extra_words):
+                digest.update(word.encode("utf-8") + b"\0")
+            self.fingerprint = (self.dictionary_version, digest.hexdigest())
+        return self.fingerprint[1]
+
+    def cancel(self):
+        """Cancel the run in progress"""
+        self.cancel_event.set()
+        if self.active_run is not None:
+            self.active_run.value = 0
+        for future in list(self.futures):
+            future.cancel()
+
+    def close(self):
+        """Shut down the worker processes, if any"""
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+            _inherited_spell.pop(self.pool_key, None)
+        self.pool = None
+        self.pool_key = None
+
+    def get_pool(self, num_workers):
+        """Return a process pool whose workers hold the current dictionary"""
+        key = (id(self), self.dictionary_version, num_workers)
+        if self.pool is not None and self.pool_key == key:
+            return self.pool
+
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.close()
+        if self.active_run is None:
+            self.active_run = multiprocessing.Value("Q", 0)
+        # Forked workers inherit the loaded dictionary instead of rebuilding it
+        if multiprocessing.get_start_method() == "fork":
+            _inherited_spell[key] = self.spell
+        self.pool = ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_worker,
+            initargs=(
+                key,
+                getattr(self.spell, "path", None),
+                getattr(self.spell, "prefilter", False),
+                self.language,
+                sorted(self.extra_words),
+                dict(self.memo.verdicts),
+                self.active_run,
+            ),
+        )
+        self.pool_key = key
+        return self.pool
+
+    @contextmanager
+    def open_source(self, source):
+        """Yield (buffer, name, path) for a Document, path, bytes or stream"""
+        if isinstance(source, Document):
+            document, owned = source, False
+        elif isinstance(source, (str, os.PathLike)):
+            document, owned = Document.open(source), True
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            document, owned = Document.from_bytes(source), True
+        elif hasattr(source, "read"):
+            document, owned = Document.from_stream(source), True
+        else:
+            raise TypeError(f"Unsupported source type: {type(source).__name__}")
+
+        try:
+            if document.modified:
+                # Check the edited text rather than what is on disk
+                buffer, path = document.text.encode("utf-8"), None
+            else:
+                buffer, path = document.buffer, document.path
+
+            if path is not None or self.backend == "thread":
+                yield buffer, document.name, path
+                return
+
+            # Process workers map byte ranges of a file, so spill the data to disk
+            import tempfile
+
+            with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as file:
+                file.write(buffer)
+            try:
+                yield buffer, document.name, file.name
+            finally:
+                os.remove(file.name)
+        finally:
+            if owned:
+                document.close()
+
+    def check_region(self, text, offset=0):
+        """Check a small piece of text, e.g. edited lines, on the calling thread"""
+        return check_text(self.spell, text, offset, self.memo)
+
+    def process_chunk(self, buffer, start, end, offset, chunk_id, cancel_event):
+        """Process a byte range of the buffer and return its misspelled words"""
+        start_time = time.perf_counter()
+        if cancel_event.is_set():
+            result = check_text(self.spell, "", offset)
+            result["cancelled"] = True
+            decoded = start_time
+        else:
+            text = buffer[start:end].decode("utf-8", errors="replace")
+            decoded = time.perf_counter()
+            result = check_text(self.spell, text, offset, self.memo, cancel_event)
+        result["id"] = chunk_id
+        return record_run(result, start_time, decoded)
+
+    def check(
+        self, source, num_workers=None, progress_callback=None, chunk_callback=None
+    ):
+        """Spell check a Document, path, bytes or stream and return a result dict
+
+        progress_callback(bytes_done, total_bytes) and chunk_callback(chunk)
+        are called from the collecting thread as each chunk finishes, so
+        partial results can be shown before the whole run is done. A
+        cancelled run returns what its chunks found up to the cancel, so
+        merging takes no longer than the work that was done.
+        """
+        num_workers = max(1, num_workers or self.num_workers)
+        cancel_event = self.cancel_event = threading.Event()
+        self.run_id += 1
+        run_id = self.run_id
+        timings = {}
+        total_start = time.perf_counter()
+
+        stage_start = time.perf_counter()
+        with self.open_source(source) as (buffer, name, path):
+            timings["read"] = time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
+            size = len(buffer)
+            cache = self.cache
+            scheduler = ChunkScheduler(
+                buffer, num_workers, self.chunk_size, content_defined=cache is not None
+            )
+            if cache is not None:
+                fingerprint = self.dictionary_fingerprint()
+            cache_keys = {}  # {chunk id: cache key} of chunks being checked
+            submitted = {}  # {chunk id: perf_counter time it was queued}
+            cache_stats = {"hits": 0, "misses": 0}
+            if self.backend == "process":
+                executor = self.get_pool(num_workers)
+                self.active_run.value = run_id
+
+                def submit(start, end, offset, chunk_id):
+                    return executor.submit(
+                        _check_range, path, start, end, offset, chunk_id, run_id
+                    )
+
+            else:
+                executor = ThreadPoolExecutor(max_workers=num_workers)
+
+                def submit(start, end, offset, chunk_id):
+                    return executor.submit(
+                        self.process_chunk,
+                        buffer,
+                        start,
+                        end,
+                        offset,
+                        chunk_id,
+                        cancel_event,
+                    )
+
+            # Only a few tasks per worker are queued at a time, so the next cut
+            # can use the latest throughput and idle workers just take the next
+            pending = {}
+            self.futures = pending
+
+            def fill_queue():
+                while len(pending) < num_workers * QUEUE_DEPTH:
+                    chunk = scheduler.next_chunk()
+                    if chunk is None:
+                        break
+                    if cache is not None:
+                        start, end, offset, chunk_id = chunk
+                        key = cache.key(buffer[start:end], fingerprint)
+                        cached = cache.get(key)
+                        if cached is not None:
+                            cache_stats["hits"] += 1
+                            collect(chunk, cached_result(cached, offset, chunk_id))
+                            continue
+                        cache_stats["misses"] += 1
+                        cache_keys[chunk_id] = key
+                    submitted[chunk[3]] = time.perf_counter()
+                    pending[submit(*chunk)] = chunk
+
+            # Collect results as they complete
+            chunk_results = []
+            bytes_done = 0
+
+            def collect(chunk, chunk_result):
+                nonlocal bytes_done
+                start, end, offset, chunk_id = chunk
+                learned = chunk_result.pop("learned", None)
+                if learned:
+                    self.memo.merge(learned)
+                key = cache_keys.pop(chunk_id, None)
+                if key is not None and not chunk_result["cancelled"]:
+                    cache.put(key, relative_result(chunk_result, offset))
+                chunk_result["bytes"] = end - start
+
+                # When and where it ran, in seconds since the run started
+                queued = submitted.pop(chunk_id, None)
+                if queued is None:  # Answered from the cache
+                    queued = time.perf_counter()
+                    chunk_result.update(started=queued, finished=queued, worker="cache")
+                chunk_result["queue_wait"] = max(0.0, chunk_result["started"] - queued)
+                chunk_result["start"] = chunk_result.pop("started") - total_start
+                chunk_result["end"] = chunk_result.pop("finished") - total_start
+                chunk_results.append(chunk_result)
+                if chunk_callback:
+                    chunk_callback(chunk_result)
+
+                # A chunk cut short says nothing about throughput
+                if not chunk_result["cancelled"]:
+                    scheduler.record(end - start, chunk_result["time"])
+                bytes_done += end - start
+                if progress_callback:
+                    progress_callback(bytes_done, size)
+
+            cancel_deadline = None
+            try:
+                fill_queue()
+                while pending:
+                    # Running chunks stop at their next token batch once
+                    # cancelled, so give them a moment to return partial results
+                    if cancel_event.is_set():
+                        if cancel_deadline is None:
+                            cancel_deadline = time.perf_counter() + CANCEL_TIMEOUT
+                        timeout = cancel_deadline - time.perf_counter()
+                        if timeout <= 0:
+                            break
+                    else:
+                        # Chunks already sent to a process cannot be cancelled,
+                        # so wake up now and then to notice a cancel
+                        timeout = CANCEL_TIMEOUT
+                    done, _ = wait(
+                        list(pending), timeout=timeout, return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        chunk = pending.pop(future)
+                        if not future.cancelled():
+                            collect(chunk, future.result())
+                    if not cancel_event.is_set():
+                        fill_queue()
+            finally:
+                self.futures = {}
+                for future in pending:
+                    future.cancel()
+                if self.backend == "thread":
+                    # Chunks still running after a cancel finish on their own
+                    executor.shutdown(wait=cancel_deadline is None)
+                if cache is not None:
+                    cache.flush()
+            timings["chunk"] = scheduler.elapsed
+            timings["check"] = time.perf_counter() - stage_start - scheduler.elapsed
+
+        cancelled = cancel_event.is_set()
+        stage_start = time.perf_counter()
+        result = self.merge_results(chunk_results)
+        timings["merge"] = time.perf_counter() - stage_start
+        timings["total"] = time.perf_counter() - total_start
+        # Work done inside the chunks, summed over all workers
+        for stage in ("decode", "tokenize", "lookup", "count"):
+            timings[stage] = sum(
+                chunk["timings"].get(stage, 0.0) for chunk in result["chunks"]
+            )
+
+        result.update(
+            {
+                "source": name,
+                "bytes": size,
+                "workers": num_workers,
+                "backend": self.backend,
+                "cancelled": cancelled,
+                "cache": cache_stats,
+                "timings": timings,
+            }
+        )
+        return result
+
+    def best_corrections(self, words, index, num_workers=None):
+        """{word: (best suggestion, confidence)} for words, computed in parallel
+
+        Thread workers share index. Process workers memory-map the file the
+        index was loaded from or saved to, and fall back to threads if it
+        only exists in memory.
+        """
+        words = list(words)
+        num_workers = max(1, num_workers or self.num_workers)
+        batch_size = max(1, -(-len(words) // (num_workers * QUEUE_DEPTH)))
+        batches = [
+            words[start : start + batch_size]
+            for start in range(0, len(words), batch_size)
+        ]
+
+        corrections = {}
+        if self.backend == "process" and index.path:
+            executor = self.get_pool(num_workers)
+            futures = [
+                executor.submit(_best_corrections, index.path, batch)
+                for batch in batches
+            ]
+            for future in futures:
+                corrections.update(future.result())
+            return corrections
+
+        def correct(batch):
+            return {word: index.correction(word) for word in batch}
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            for batch_corrections in executor.map(correct, batches):
+                corrections.update(batch_corrections)
+        return corrections
+
+    def merge_results(self, chunk_results):
+        """Combine per-chunk results into a single result dict
+
+        Every occurrence of a misspelled word has a span, so the words and
+        their counts follow from the merged spans in one pass over them.
+        """
+        chunk_results.sort(key=lambda chunk: chunk["id"])
+        offsets = {}
+        for chunk in chunk_results:
+            for word, spans in chunk["offsets"].items():
+                merged = offsets.get(word)
+                if merged is None:
+                    offsets[word] = spans.copy()  # The chunk's list may be shown
+                else:
+                    merged += spans
+        counts = Counter({word: len(spans) for word, spans in offsets.items()})
+
+        return {
+            "total_words": sum(chunk["words"] for chunk in chunk_results),
+            "dictionary_lookups": sum(chunk["lookups"] for chunk in chunk_results),
+            "misspelled": sorted(offsets),
+            "counts": dict(counts.most_common()),
+            "offsets": offsets,
+            "chunks": [
+                {
+                    "id": chunk["id"],
+                    "words": chunk["words"],
+                    "bytes": chunk["bytes"],
+                    "misspelled": len(chunk["misspelled"]),
+                    "time": chunk["time"],
+                    "start": chunk["start"],
+                    "end": chunk["end"],
+                    "queue_wait": chunk["queue_wait"],
+                    "worker": chunk["worker"],
+                    "pid": chunk.get("pid", 0),
+                    "tid": chunk.get("tid", 0),
+                    "timings": chunk["timings"],
+                }
+                for chunk in chunk_results
+            ],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Spell check text files without the GUI and print JSON results"
+    )
+    parser.add_argument("paths", nargs="+", help="files to check, '-' for stdin")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="worker count")
+    parser.add_argument(
+        "-b", "--backend", choices=BACKENDS, default="thread", help="worker backend"
+    )
+    parser.add_argument(
+        "--ignore",
+        action="append",
+        default=[],
+        metavar="WORDS",
+        help="comma-separated extra words to accept as correct, may be repeated",
+    )
+    parser.add_argument(
+        "--prefilter",
+        action="store_true",
+        help="rule out unknown words with the dictionary's Bloom filter first",
+    )
+    parser.add_argument(
+        "--trace-dir",
+        help="save a JSON trace and a Chrome trace of each run in this directory",
+    )
+    parser.add_argument("--indent", type=int, default=None, help="JSON indentation")
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        help="reuse per-chunk results from the cache database at PATH "
+        f"(the GUI's is {DEFAULT_CACHE_PATH})",
+    )
+    args = parser.parse_args(argv)
+    ignore = [word for value in args.ignore for word in value.split(",") if word]
+
+    cache = ResultCache(args.cache) if args.cache else None
+    engine = SpellEngine(
+        num_workers=args.workers,
+        backend=args.backend,
+        cache=cache,
+        prefilter=args.prefilter,
+    )
+    if ignore:
+        engine.add_words(ignore)
+
+    status = 0
+    try:
+        for path in args.paths:
+            try:
+                source = sys.stdin.buffer if path == "-" else path
+                result = engine.check(source)
+            except Exception as e:
+                print(f"{path}: {e}", file=sys.stderr)
+                status = 1
+                continue
+            print(json.dumps(result, indent=args.indent, ensure_ascii=False))
+            if args.trace_dir:
+                os.makedirs(args.trace_dir, exist_ok=True)
+                name = "stdin" if path == "-" else os.path.basename(path)
+                trace = run_trace(result)
+                base = os.path.join(args.trace_dir, name)
+                write_trace(f"{base}.trace.json", trace)
+                write_chrome_trace(f"{base}.chrome.json", trace)
+    finally:
+        engine.close()
+        if cache is not None:
+            cache.close()
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
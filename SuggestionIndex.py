@@ -0,0 +1,408 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+# File layout: header, frequencies, word offsets, delete hashes, word ids, words.
+# The header is 40 bytes so the 8-byte frequency table starts aligned.
+MAGIC = b"SYMS"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIIIIIQ")
+
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.expanduser("~"), ".parallel_spell_checker", "suggestions.idx"
+)
+
+# Suggestions weighed against each other when rating a correction
+CORRECTION_CANDIDATES = 10
+
+
+def deletes(word, max_distance):
+    """All strings reachable from word by deleting up to max_distance characters"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {
+            variant[:i] + variant[i + 1 :]
+            for variant in frontier
+            if len(variant) > 1
+            for i in range(len(variant))
+        }
+        result |= frontier
+    return result
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between a and b, or limit + 1 if larger"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    # Shared prefixes and suffixes never add to the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a or not b:
+        return min(max(len(a), len(b)), limit + 1)
+
+    big = limit + 1
+    len_b = len(b)
+    previous2 = None
+    previous = list(range(len_b + 1))
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        current = [i] + [big] * len_b
+        row_min = i
+        # Cells further than limit from the diagonal cannot be within limit
+        for j in range(max(1, i - limit), min(len_b, i + limit) + 1):
+            char_b = b[j - 1]
+            value = previous[j - 1] if char_a == char_b else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            # Adjacent transposition counts as a single edit
+            if (
+                i > 1
+                and j > 1
+                and char_a == b[j - 2]
+                and a[i - 2] == char_b
+                and previous2[j - 2] + 1 < value
+            ):
+                value = previous2[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return big
+        previous2, previous = previous, current
+
+    return min(previous[-1], big)
+
+
+def dictionary_fingerprint(frequencies):
+    """Cheap fingerprint telling whether an index matches a word-frequency dict"""
+    return ((len(frequencies) << 40) ^ sum(frequencies.values())) & (2**64 - 1)
+
+
+def delete_hash(text):
+    """Stable 32-bit hash of a delete variant, the same in every process"""
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class SuggestionIndex:
+    """Symmetric-delete (SymSpell) suggestion index over a word-frequency table
+
+    Every dictionary word is indexed under the hashes of the strings obtained
+    by deleting up to max_distance characters from its first prefix_length
+    characters. Looking up a misspelling only generates the deletes of the
+    misspelling itself, so suggestions come back without enumerating edits.
+    The tables are flat arrays that can be saved once and memory-mapped.
+    """
+
+    def __init__(self, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.fingerprint = 0
+        self.word_offsets = array("I", [0])
+        self.frequencies = array("Q")
+        self.hashes = array("I")
+        self.ids = array("I")
+        self.text = b""
+        self.view = None
+        self.mapping = None
+        self.path = None  # File the index was loaded from or saved to
+
+        # Words added after the index was built, {delete hash: [word, ...]}
+        self.extra_words = {}
+        self.extra_frequencies = {}
+
+    @classmethod
+    def build(cls, frequencies, max_distance=2, prefix_length=7):
+        """Build an index from a {word: frequency} mapping"""
+        index = cls(max_distance, prefix_length)
+        index.fingerprint = dictionary_fingerprint(frequencies)
+
+        words = sorted(frequencies)
+        encoded = [word.encode("utf-8") for word in words]
+        offset = 0
+        for data in encoded:
+            offset += len(data)
+            index.word_offsets.append(offset)
+        index.frequencies = array("Q", (frequencies[word] for word in words))
+        index.text = b"".join(encoded)
+
+        # Pack (hash, word id) into one integer so a single sort orders both
+        entries = []
+        for word_id, word in enumerate(words):
+            for variant in deletes(word[:prefix_length], max_distance):
+                entries.append(delete_hash(variant) << 32 | word_id)
+        entries.sort()
+
+        index.hashes = array("I", (entry >> 32 for entry in entries))
+        index.ids = array("I", (entry & 0xFFFFFFFF for entry in entries))
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a saved index"""
+        with open(path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), length=0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            version,
+            max_distance,
+            prefix_length,
+            word_count,
+            entry_count,
+            text_size,
+            _reserved,
+            fingerprint,
+        ) = HEADER.unpack_from(mapping)
+        if magic != MAGIC or version != VERSION:
+            mapping.close()
+            raise ValueError(f"Not a suggestion index: {path}")
+
+        index = cls(max_distance, prefix_length)
+        index.fingerprint = fingerprint
+        index.path = path
+        index.mapping = mapping
+        index.view = view = memoryview(mapping)
+        position = HEADER.size
+        sections = [
+            ("frequencies", "Q", word_count),
+            ("word_offsets", "I", word_count + 1),
+            ("hashes", "I", entry_count),
+            ("ids", "I", entry_count),
+        ]
+        for name, typecode, count in sections:
+            size = count * array(typecode).itemsize
+            setattr(index, name, view[position : position + size].cast(typecode))
+            position += size
+        index.text = view[position : position + text_size]
+        return index
+
+    @classmethod
+    def load_or_build(cls, frequencies, path=DEFAULT_INDEX_PATH):
+        """Load the index saved at path, rebuilding it if the dictionary changed"""
+        fingerprint = dictionary_fingerprint(frequencies)
+        if path and os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if index.fingerprint == fingerprint:
+                    return index
+                index.close()
+            except (OSError, ValueError, struct.error):
+                pass
+
+        index = cls.build(frequencies)
+        if path:
+            try:
+                index.save(path)
+            except OSError as e:
+                print(f"Could not save suggestion index: {e}")
+        return index
+
+    def save(self, path):
+        """Write the index to path in the memory-mappable layout"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    self.max_distance,
+                    self.prefix_length,
+                    len(self.frequencies),
+                    len(self.hashes),
+                    len(self.text),
+                    0,
+                    self.fingerprint,
+                )
+            )
+            for table in (self.frequencies, self.word_offsets, self.hashes, self.ids):
+                file.write(memoryview(table).cast("B"))
+            file.write(self.text)
+        os.replace(temp_path, path)
+        self.path = path
+
+    def close(self):
+        """Release the memory map of a loaded index"""
+        if self.mapping is not None:
+            for name in ("word_offsets", "frequencies", "hashes", "ids", "text"):
+                getattr(self, name).release()
+            self.view.release()
+            self.mapping.close()
+            self.mapping = None
+
+    def add_words(self, words, frequency=1):
+        """Make words available as suggestions without rebuilding the index"""
+        for word in words:
+            word = word.lower()
+            self.extra_frequencies[word] = frequency
+            for variant in deletes(word[: self.prefix_length], self.max_distance):
+                self.extra_words.setdefault(delete_hash(variant), []).append(word)
+
+    def word(self, word_id):
+        """Dictionary word stored under word_id"""
+        start = self.word_offsets[word_id]
+        end = self.word_offsets[word_id + 1]
+        return bytes(self.text[start:end]).decode("utf-8")
+
+    def lookup(self, word, count=10, max_distance=None):
+        """Closest dictionary words to word, nearest and most frequent first"""
+        suggestions = self.scored_lookup(word, count, max_distance)
+        return [candidate for _, _, candidate in suggestions]
+
+    def correction(self, word):
+        """Best suggestion for word and how confident the index is in it
+
+        Confidence is the best suggestion's share of the total frequency of
+        all suggestions at the same edit distance, divided by that distance:
+        a lone suggestion one edit away scores 1.0, a lone one two edits
+        away 0.5, and close competitors pull the score down.
+        """
+        suggestions = self.scored_lookup(word, CORRECTION_CANDIDATES)
+        if not suggestions:
+            return None, 0.0
+        distance, frequency, best = suggestions[0]
+        tied = sum(-other for d, other, _ in suggestions if d == distance)
+        return best, -frequency / max(1, tied) / max(1, distance)
+
+    def scored_lookup(self, word, count=10, max_distance=None):
+        """Closest dictionary words as (distance, -frequency, word), best first"""
+        word = word.lower()
+        if max_distance is None:
+            max_distance = self.max_distance
+
+        # Closer variants first, so the distance limit can tighten early on
+        variants = sorted(deletes(word[: self.prefix_length], max_distance), key=len)
+        variants.reverse()
+
+        seen = set()
+        suggestions = []
+        limit = max_distance
+        for variant in variants:
+            key = delete_hash(variant)
+            candidates = []
+            position = bisect_left(self.hashes, key)
+            while position < len(self.hashes) and self.hashes[position] == key:
+                word_id = self.ids[position]
+                position += 1
+                if word_id not in seen:
+                    seen.add(word_id)
+                    candidates.append((self.word(word_id), self.frequencies[word_id]))
+            for candidate in self.extra_words.get(key, ()):
+                if candidate not in seen:
+                    seen.add(candidate)
+                    candidates.append((candidate, self.extra_frequencies[candidate]))
+
+            for candidate, frequency in candidates:
+                distance = edit_distance(word, candidate, limit)
+                if distance <= limit:
+                    suggestions.append((distance, -frequency, candidate))
+
+            # Once count suggestions are this close, farther ones cannot make it
+            if len(suggestions) >= count:
+                suggestions.sort()
+                del suggestions[count:]
+                limit = suggestions[-1][0]
+
+        suggestions.sort()
+        return suggestions[:count]
+
+
+class SuggestionCache:
+    """Bounded least-recently-used cache in front of a suggestion function"""
+
+    def __init__(self, suggest, maxsize=2048):
+        self.suggest = suggest
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prewarmed = 0
+
+    def get(self, word, count=10):
+        """Suggestions for word, computed only if not cached yet"""
+        with self.lock:
+            suggestions = self.entries.get(word)
+            if suggestions is not None:
+                self.entries.move_to_end(word)
+                self.hits += 1
+                return suggestions[:count]
+            self.misses += 1
+
+        suggestions = self.suggest(word, count)
+        self.store(word, suggestions)
+        return suggestions
+
+    def store(self, word, suggestions):
+        """Remember suggestions for word, evicting the least recently used"""
+        with self.lock:
+            self.entries[word] = suggestions
+            self.entries.move_to_end(word)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def prewarm(self, words, count=10, stop_event=None):
+        """Compute suggestions for words ahead of time, most important first"""
+        for word in words:
+            if stop_event is not None and stop_event.is_set():
+                return
+            with self.lock:
+                if word in self.entries:
+                    continue
+            self.store(word, self.suggest(word, count))
+            with self.lock:
+                self.prewarmed += 1
+
+    def clear(self):
+        """Drop all cached suggestions, e.g. after the dictionary changed"""
+        with self.lock:
+            self.entries.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the suggestion index for the spell checker dictionary"
+    )
+    parser.add_argument("--output", default=DEFAULT_INDEX_PATH, help="index path")
+    parser.add_argument("--language", default="en", help="dictionary language")
+    parser.add_argument("lookup", nargs="*", help="words to look up afterwards")
+    args = parser.parse_args(argv)
+
+    from spellchecker import SpellChecker
+
+    frequencies = SpellChecker(language=args.language).word_frequency.dictionary
+
+    start_time = time.perf_counter()
+    index = SuggestionIndex.build(frequencies)
+    index.save(args.output)
+    print(
+        f"Indexed {len(index.frequencies):,} words as {len(index.hashes):,} deletes "
+        f"in {time.perf_counter() - start_time:.1f}s -> {args.output}"
+    )
+
+    index = SuggestionIndex.load(args.output)
+    for word in args.lookup:
+        print(f"{word}: {', '.join(index.lookup(word))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
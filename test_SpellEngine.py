@@ -0,0 +1,231 @@
+import random
+from collections import Counter
+
+import pytest
+
+import SpellEngine
+from CompactDictionary import CompactDictionary
+from ResultCache import ResultCache
+from SpellEngine import (
+    Document,
+    EditJournal,
+    OccurrenceIndex,
+    WordMemo,
+    apply_edits,
+    correction_edits,
+    find_occurrences,
+    inverse_edits,
+    line_starts,
+    shift_line_starts,
+    shift_spans,
+)
+
+WORDS = [
+    "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "and",
+    "teh", "quikc", "borwn", "recieve", "definately", "seperate",
+    "café", "naïve", "don’t", "wasn't", "😀", "42", "well-known",
+]  # fmt: skip
+
+
+def sample_text(lines, seed=0):
+    """Lines of random words, misspellings and non-ASCII characters included"""
+    rng = random.Random(seed)
+    return "".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 12))) + "\n"
+        for _ in range(lines)
+    )
+
+
+def random_edits(rng, text, count, alphabet="ab \n"):
+    """Sorted, non-overlapping (start, end, replacement) edits of text"""
+    edits = []
+    position = 0
+    for _ in range(count):
+        if position > len(text):
+            break
+        start = rng.randint(position, len(text))
+        end = rng.randint(start, min(len(text), start + 10))
+        new = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 6)))
+        edits.append((start, end, new))
+        position = end + 1
+    return edits
+
+
+@pytest.fixture(scope="module")
+def spell():
+    return CompactDictionary.load_or_build()
+
+
+@pytest.fixture(scope="module", params=SpellEngine.BACKENDS)
+def engine(request, spell):
+    engine = SpellEngine.SpellEngine(
+        spell, num_workers=2, backend=request.param, chunk_size=4096
+    )
+    yield engine
+    engine.close()
+
+
+def assert_spans_match(result, text):
+    """Every reported span covers its word in the decoded text"""
+    for word, spans in result["offsets"].items():
+        assert len(spans) == result["counts"][word]
+        for start, end in spans:
+            assert text[start:end].replace("’", "'").lower() == word
+
+
+def test_backends_match_a_single_pass(engine, tmp_path):
+    text = sample_text(3000)
+    path = tmp_path / "sample.txt"
+    path.write_text(text, encoding="utf-8")
+
+    result = engine.check(str(path))
+    expected = engine.check_region(text)
+
+    assert len(result["chunks"]) > 1
+    assert not result["cancelled"]
+    assert result["total_words"] == expected["words"]
+    assert result["misspelled"] == sorted(expected["misspelled"])
+    assert result["counts"] == dict(expected["counts"])
+    assert result["offsets"] == expected["offsets"]
+    assert_spans_match(result, text)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1252"])
+def test_offsets_across_chunks(engine, tmp_path, encoding):
+    # cp1252 curly quotes are stray UTF-8 continuation bytes, each decoded
+    # to a single U+FFFD, which must not throw later chunks off
+    text = sample_text(3000, seed=1).replace("😀", "“x”")
+    path = tmp_path / f"sample-{encoding}.txt"
+    path.write_bytes(text.encode(encoding))
+
+    document = Document.open(str(path))
+    try:
+        result = engine.check(document)
+        assert len(result["chunks"]) > 1
+        assert_spans_match(result, document.text)
+
+        starts = line_starts(document.text)
+        for line in (0, 1, 999, 2999, 3000):
+            lines, offset = Document.open(str(path)).lines(line, line + 1)
+            assert offset == starts[line]
+            assert document.text[offset : offset + len(lines)] == lines
+    finally:
+        document.close()
+
+
+def test_corrections_undo_and_redo():
+    text = sample_text(200)
+    corrections = {"teh": "the", "quikc": "quick", "recieve": "receive"}
+    edits = correction_edits(text, corrections)
+    assert edits
+
+    journal = EditJournal()
+    journal.record(text, edits, "state")
+    corrected = apply_edits(text, edits)
+    assert not find_occurrences(corrected, corrections)
+
+    inverse, state = journal.undo()
+    assert state == "state"
+    assert apply_edits(corrected, inverse) == text
+    redo, _ = journal.redo()
+    assert apply_edits(text, redo) == corrected
+
+
+def test_random_edits_round_trip():
+    rng = random.Random(2)
+    for _ in range(500):
+        text = "".join(rng.choice("ab \n") for _ in range(rng.randint(0, 40)))
+        edits = random_edits(rng, text, rng.randint(1, 4))
+        edited = apply_edits(text, edits)
+
+        assert shift_line_starts(line_starts(text), edits) == line_starts(edited)
+        removed = [text[start:end] for start, end, _ in edits]
+        assert apply_edits(edited, inverse_edits(edits, removed)) == text
+
+
+def test_document_edits_in_blocks(monkeypatch):
+    monkeypatch.setattr(SpellEngine, "TEXT_BLOCK", 8)
+    rng = random.Random(3)
+    for _ in range(300):
+        text = "".join(rng.choice("ab \n") for _ in range(rng.randint(0, 60)))
+        document = Document.from_bytes(text.encode())
+        for _ in range(rng.randint(1, 5)):
+            edits = random_edits(rng, text, rng.randint(1, 3))
+            text = apply_edits(text, edits)
+            document.apply_edits(edits)
+
+            starts = line_starts(text)
+            assert document.text == text
+            assert list(document.line_starts) == starts
+            first = rng.randrange(len(starts))
+            lines, offset = document.lines(first, first + 2)
+            assert offset == starts[first]
+            assert lines == text[offset : offset + len(lines)]
+
+
+def test_occurrence_index_follows_typed_edits():
+    rng = random.Random(4)
+    words = {"teh", "quikc"}
+    text = sample_text(40, seed=4)
+    eager = find_occurrences(text, words)
+    index = OccurrenceIndex({word: list(spans) for word, spans in eager.items()})
+    for _ in range(50):
+        # Typed edits replace whole lines, as DocumentView.sync makes them
+        starts = line_starts(text)
+        first = rng.randrange(len(starts))
+        last = rng.randint(first, len(starts))
+        start = starts[first]
+        end = starts[last] if last < len(starts) else len(text)
+        replacement = sample_text(rng.randint(0, 3), seed=rng.random())
+        edit = (start, end, replacement)
+        found = find_occurrences(replacement, words, start)
+
+        lost = Counter()
+        for word, spans in eager.items():
+            kept = [span for span in spans if span[1] <= start or span[0] >= end]
+            lost[word] += len(spans) - len(kept)
+            eager[word] = shift_spans(kept, [edit])
+        for word, spans in found.items():
+            eager.setdefault(word, []).extend(spans)
+            eager[word].sort()
+
+        assert +index.apply_edit(edit, text[start:end], found) == +lost
+        text = apply_edits(text, [edit])
+    assert index.current() == {word: spans for word, spans in eager.items() if spans}
+    assert index.current() == find_occurrences(text, words)
+
+
+def test_compact_dictionary_matches_pyspellchecker(spell):
+    from spellchecker import SpellChecker
+
+    words = set(sample_text(50).lower().split()) | {"zzzx", "Hello", "I'm", "x"}
+    assert spell.unknown(words) == SpellChecker().unknown(words)
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    key = cache.key(b"teh cat", "fingerprint")
+    result = {
+        "words": 2,
+        "misspelled": {"teh"},
+        "counts": Counter({"teh": 1}),
+        "offsets": {"teh": [(0, 3)]},
+    }
+    assert cache.get(key) is None
+    cache.put(key, result)
+    assert cache.get(key) == result
+    assert cache.get(cache.key(b"teh cat", "other")) is None
+    cache.close()
+
+    reopened = ResultCache(str(tmp_path / "cache.sqlite"))
+    assert reopened.get(key) == result
+    reopened.close()
+
+
+def test_word_memo_starts_over_when_full(spell):
+    memo = WordMemo(max_words=3)
+    assert memo.unknown(spell, {"teh", "the"}) == ({"teh"}, 2)
+    assert memo.unknown(spell, {"teh", "the"}) == ({"teh"}, 0)
+    assert memo.unknown(spell, {"quikc", "fox"}) == ({"quikc"}, 2)
+    assert len(memo.verdicts) == 2  # Forgot the first two words
+    assert memo.unknown(spell, {"teh"}) == ({"teh"}, 1)